@@ -0,0 +1,330 @@
+"""
+Incrementally updatable aggregates of a processed dataset.
+
+Everything the summary statistics and the chart data need is kept as
+mergeable accumulators in the dataset metadata: the count, means and
+co-moment matrix of every column (for means, variances and the correlation
+matrix), fixed-width histogram counts, and a small cube of per-year and
+per-country counts, sums, sums of squares, minima and maxima of every
+indicator. Views read these in time proportional to the number of groups,
+never the rows. Aggregates are built in one pass over chunks of rows and
+updated with appended rows, so the cost of an update scales with the size
+of the change rather than the whole history. Histograms laid over the
+values' full range come out the same however the rows were chunked.
+"""
+
+import numpy as np
+import pandas as pd
+
+from online_stats import Histogram, Moments
+
+# Columns the cube groups by; every other column is an indicator
+CUBE_DIMENSIONS = ('Year', 'Country')
+CUBE_STATISTICS = ('count', 'sum', 'sum_sq', 'min', 'max')
+# Indicators shown in the distribution and time series charts
+DISTRIBUTION_INDICATORS = ['mental_fitness', 'depression', 'anxiety', 'drug_usage', 'alcohol']
+TREND_INDICATORS = ['mental_fitness', 'depression', 'anxiety', 'drug_usage', 'alcohol']
+HISTOGRAM_BINS = 30
+
+
+def empty_aggregates(columns):
+    """Aggregates of no rows with the given columns"""
+    return {
+        'columns': list(columns),
+        'moments': Moments(len(columns)).to_dict(),
+        'histograms': {},
+        'cube': {},
+        'last_year': {}
+    }
+
+
+def compute_aggregates(df, bins=HISTOGRAM_BINS, chunk_size=None):
+    """Aggregate a processed frame from scratch in one pass, chunk_size rows at a time
+
+    Each histogram splits its column's full range into `bins` bins, so the
+    result does not depend on chunk_size.
+    """
+    ranges = {}
+    for indicator in [col for col in DISTRIBUTION_INDICATORS if col in df.columns]:
+        values = df[indicator].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            ranges[indicator] = (values.min(), values.max())
+    builder = AggregateBuilder(empty_aggregates(df.columns), bins, ranges)
+    chunk_size = chunk_size or max(len(df), 1)
+    for start in range(0, len(df), chunk_size):
+        builder.update(df.iloc[start:start + chunk_size])
+    return builder.result()
+
+
+def update_aggregates(aggregates, df, bins=HISTOGRAM_BINS):
+    """Return aggregates with the rows of df added in
+
+    df must have the aggregated columns; nothing in the old totals is
+    recomputed. Histograms keep their bin grid and grow extra bins when new
+    values fall outside the current range, merging adjacent bins to stay
+    within `bins`.
+    """
+    return AggregateBuilder(aggregates, bins).update(df).result()
+
+
+def recount_histograms(aggregates, chunks, bins=HISTOGRAM_BINS):
+    """Return aggregates with histograms counted again over chunks of their rows
+
+    A chunked pass learns each column's range only as it goes, so its
+    histograms are laid over the first chunk's range and regridded as it
+    grows. Counted again on the full range recorded in the moments, they
+    match compute_aggregates of the whole frame.
+    """
+    builder = AggregateBuilder(empty_aggregates(aggregates['columns']), bins, histogram_ranges(aggregates))
+    for chunk in chunks:
+        builder.update_histograms(chunk)
+    return dict(aggregates, histograms=builder.result()['histograms'])
+
+
+def histogram_ranges(aggregates):
+    """(min, max) of every distribution indicator, as recorded in the moments"""
+    moments = aggregates['moments']
+    if moments['min'] is None:
+        return {}
+    return {col: (moments['min'][i], moments['max'][i]) for i, col in enumerate(aggregates['columns'])
+            if col in DISTRIBUTION_INDICATORS}
+
+
+class AggregateBuilder:
+    """Aggregates held as accumulators and frames while chunks are added
+
+    Converting to the stored JSON form costs time proportional to the
+    number of groups, so a chunked pass updates a builder and calls
+    result() once at the end. With ranges ({indicator: (min, max)} of all
+    rows to come), new histograms are laid over that range instead of the
+    first chunk's.
+    """
+
+    def __init__(self, aggregates, bins=HISTOGRAM_BINS, ranges=None):
+        self.columns = list(aggregates['columns'])
+        self.bins = bins
+        self.ranges = ranges or {}
+        self.moments = Moments.from_dict(aggregates['moments'])
+        self.histograms = {name: Histogram.from_dict(data) for name, data in aggregates['histograms'].items()}
+        self.groups = {dimension: _group_frames(groups) for dimension, groups in aggregates['cube'].items()}
+        self.last_year = pd.Series({int(k): v for k, v in aggregates['last_year'].items()}, dtype=np.int64)
+
+    def update(self, df):
+        """Add the rows of a chunk"""
+        if list(df.columns) != self.columns:
+            raise ValueError(f'Expected columns {self.columns}, got {list(df.columns)}')
+        if len(df) == 0:
+            return self
+
+        self.moments.update(df.to_numpy(dtype=np.float64))
+        self.update_histograms(df)
+
+        indicators = [col for col in self.columns if col not in CUBE_DIMENSIONS]
+        for dimension in [dim for dim in CUBE_DIMENSIONS if dim in self.columns]:
+            self.groups[dimension] = _combine_groups(self.groups.get(dimension),
+                                                     _group_totals(df, dimension, indicators))
+
+        if 'Year' in self.columns and 'Country' in self.columns:
+            last_year = df.groupby('Country')['Year'].max().astype(np.int64)
+            self.last_year = _combine_last_year(self.last_year, last_year)
+        return self
+
+    def update_histograms(self, df):
+        """Count the distribution indicators of a chunk"""
+        for indicator in [col for col in DISTRIBUTION_INDICATORS if col in self.columns]:
+            if indicator in self.histograms:
+                self.histograms[indicator].update(df[indicator], self.bins)
+            elif indicator in self.ranges:
+                self.histograms[indicator] = Histogram.from_range(*self.ranges[indicator], self.bins)
+                self.histograms[indicator].update(df[indicator], self.bins)
+            else:
+                histogram = Histogram.from_values(df[indicator], self.bins)
+                if histogram is not None:
+                    self.histograms[indicator] = histogram
+        return self
+
+    def result(self):
+        """The aggregates in their stored, JSON-ready form"""
+        return {
+            'columns': self.columns,
+            'moments': self.moments.to_dict(),
+            'histograms': {name: histogram.coarsen(self.bins).to_dict() for name, histogram in self.histograms.items()},
+            'cube': {dimension: _groups_dict(frames) for dimension, frames in self.groups.items()},
+            'last_year': {str(int(country)): int(year) for country, year in self.last_year.items()}
+        }
+
+
+def new_rows_mask(aggregates, df):
+    """Boolean mask of rows whose year is later than anything stored for their country"""
+    if 'Country' not in df.columns or 'Year' not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    last_year = pd.Series({int(k): v for k, v in aggregates['last_year'].items()}, dtype=float)
+    previous = last_year.reindex(df['Country'].to_numpy()).to_numpy()
+    return np.isnan(previous) | (df['Year'].to_numpy() > previous)
+
+
+def aggregate_statistics(aggregates, target='mental_fitness'):
+    """Summary statistics in the same shape as the analysis pipeline's"""
+    columns = aggregates['columns']
+    i = columns.index(target)
+    moments = aggregates['moments']
+    mean, std = _mean_std(aggregates, i)
+    return {
+        'shape': [moments['count'], len(columns)],
+        'columns': columns,
+        f'mean_{target}': mean,
+        f'std_{target}': std,
+        f'min_{target}': moments['min'][i] if moments['min'] else None,
+        f'max_{target}': moments['max'][i] if moments['max'] else None
+    }
+
+
+def aggregate_groups(aggregates, dimension):
+    """Count, mean, std, min and max of every indicator per value of a cube dimension"""
+    groups = aggregates['cube'].get(dimension)
+    if groups is None:
+        return None
+    count, total, total_sq = (np.asarray(groups[name], dtype=float) for name in ('count', 'sum', 'sum_sq'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        variance = np.maximum(total_sq - total * mean, 0.0) / (count - 1)
+    std = np.where(count > 1, np.sqrt(variance), np.nan)
+
+    indicators = {}
+    for j, col in enumerate(groups['columns']):
+        indicators[col] = {
+            'count': count[:, j].astype(int).tolist(),
+            'mean': _clean(mean[:, j]),
+            'std': _clean(std[:, j]),
+            'min': _clean(np.asarray(groups['min'], dtype=float)[:, j]),
+            'max': _clean(np.asarray(groups['max'], dtype=float)[:, j])
+        }
+    return {'dimension': dimension, 'keys': groups['keys'], 'indicators': indicators}
+
+
+def aggregate_chart_data(aggregates):
+    """Correlation, distribution and time series data computed from the totals alone"""
+    return {
+        'correlation': _correlation(aggregates),
+        'distribution': _distribution(aggregates),
+        'time_series': _time_series(aggregates)
+    }
+
+
+def feature_importance_data(feature_names, importance_scores):
+    """Feature importances sorted from most to least important"""
+    order = np.argsort(importance_scores)[::-1]
+    return [
+        {'feature': feature_names[i], 'importance': float(importance_scores[i])}
+        for i in order
+    ]
+
+
+def _clean(values):
+    """Convert a float array to a list with NaN/inf replaced by None"""
+    return [float(v) if np.isfinite(v) else None for v in np.asarray(values, dtype=float).ravel()]
+
+
+def _correlation(aggregates):
+    matrix = Moments.from_dict(aggregates['moments']).correlation()
+    return {
+        'columns': aggregates['columns'],
+        'matrix': [_clean(row) for row in matrix]
+    }
+
+
+def _distribution(aggregates):
+    indicators = {}
+    for indicator, histogram in aggregates['histograms'].items():
+        mean, std = _mean_std(aggregates, aggregates['columns'].index(indicator))
+        indicators[indicator] = {
+            'counts': histogram['counts'],
+            'edges': _clean(histogram['edges']),
+            'mean': mean,
+            'std': std
+        }
+    return indicators
+
+
+def _time_series(aggregates):
+    groups = aggregate_groups(aggregates, 'Year')
+    columns = [col for col in TREND_INDICATORS if groups and col in groups['indicators']]
+    if not columns or len(groups['keys']) < 2:
+        return None
+
+    years = np.asarray(groups['keys'], dtype=float)
+    series = {}
+    for col in columns:
+        values = np.asarray(groups['indicators'][col]['mean'], dtype=float)
+        slope, intercept = np.polyfit(years, values, 1)
+        series[col] = {
+            'values': _clean(values),
+            'trend': {'slope': float(slope), 'intercept': float(intercept)}
+        }
+    return {'years': _clean(years), 'series': series}
+
+
+def _mean_std(aggregates, i):
+    moments = Moments.from_dict(aggregates['moments'])
+    if moments.count == 0:
+        return None, None
+    mean = float(moments.mean[i])
+    if moments.count < 2:
+        return mean, None
+    return mean, float(moments.std()[i])
+
+
+def _group_totals(df, dimension, columns):
+    # Kept as one (group x indicator) frame per statistic, indexed by the integer group key
+    values = df[columns].astype(np.float64)
+    keys = df[dimension].to_numpy(dtype=np.int64)
+    grouped = values.groupby(keys)
+    return {
+        'count': grouped.count(),
+        'sum': grouped.sum(),
+        'sum_sq': (values ** 2).groupby(keys).sum(),
+        'min': grouped.min(),
+        'max': grouped.max()
+    }
+
+
+def _combine_groups(left, right):
+    if left is None or right is None:
+        return left if right is None else right
+    combined = {}
+    for name in CUBE_STATISTICS:
+        grouped = pd.concat([left[name], right[name]]).groupby(level=0)
+        combined[name] = getattr(grouped, name if name in ('min', 'max') else 'sum')()
+    return combined
+
+
+def _group_frames(groups):
+    shape = (len(groups['keys']), len(groups['columns']))
+    return {
+        name: pd.DataFrame(np.asarray(groups[name], dtype=float).reshape(shape),
+                           index=pd.Index(groups['keys'], dtype=np.int64), columns=groups['columns'])
+        for name in CUBE_STATISTICS
+    }
+
+
+def _groups_dict(frames):
+    def clean(frame):
+        values = frame.to_numpy(dtype=float)
+        return np.where(np.isfinite(values), values, None).tolist()
+
+    return {
+        'columns': list(frames['count'].columns),
+        'keys': frames['count'].index.astype(np.int64).tolist(),
+        'count': frames['count'].to_numpy(dtype=np.int64).tolist(),
+        'sum': frames['sum'].to_numpy(dtype=float).tolist(),
+        'sum_sq': frames['sum_sq'].to_numpy(dtype=float).tolist(),
+        'min': clean(frames['min']),
+        'max': clean(frames['max'])
+    }
+
+
+def _combine_last_year(left, right):
+    if len(left) == 0 or len(right) == 0:
+        return right if len(left) == 0 else left
+    return pd.concat([left, right]).groupby(level=0).max()
@@ -1,11 +1,9 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_file, url_for, abort, Response, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import mean_squared_error, r2_score
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
@@ -16,159 +14,377 @@ os.environ['MPLCONFIGDIR'] = os.environ.get('MPLCONFIGDIR', '/tmp/matplotlib')
 import seaborn as sns
 import io
 import base64
+import copy
 import json
 import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
 from werkzeug.utils import secure_filename
+from result_cache import ResultCache, content_key, stream_key
+from chart_executor import ChartExecutor
+from chart_store import ChartStore
+from model_registry import ModelRegistry
+from job_manager import JobManager, QueueFullError
+from ingest import COLUMN_MAPPING, read_csv_payload, read_csv_chunks
+from dataset_store import DatasetStore
+from model_engines import ENGINES, AUTO_ENGINE, fit_engine, select_engine, feature_importances
+from cross_validation import CrossValidator, GROUP_BY
+from compact_forest import CompactForest
+from importance import PermutationImportance
+from tuning import SEARCH_SPACES, successive_halving, refit_candidate
+from joins import merge_datasets, merge_sorted_chunks
+from country_dictionary import CountryDictionary
+from trends import TrendStore, series_trend
+from dataset_index import IndexStore
+from online_stats import ReservoirSample
+from aggregates import (CUBE_DIMENSIONS, AggregateBuilder, empty_aggregates, compute_aggregates, update_aggregates,
+                        recount_histograms, new_rows_mask, aggregate_statistics, aggregate_chart_data,
+                        aggregate_groups, feature_importance_data)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # Arrow input is optional
+    pa = None
 
 app = Flask(__name__)
 CORS(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
+CHART_FOLDER = os.path.join(UPLOAD_FOLDER, 'charts')
+MODEL_FOLDER = os.environ.get('MODEL_FOLDER', 'models')
+JOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'jobs')
+EVALUATION_FOLDER = os.path.join(UPLOAD_FOLDER, 'evaluations')
+TREND_FOLDER = os.path.join(UPLOAD_FOLDER, 'trends')
+INDEX_FOLDER = os.path.join(UPLOAD_FOLDER, 'indexes')
+DATASET_FOLDER = os.environ.get('DATASET_FOLDER', 'datasets')
+# Stored datasets hold country codes, so the dictionary lives next to them
+COUNTRY_DICTIONARY_PATH = os.environ.get('COUNTRY_DICTIONARY_PATH', os.path.join(DATASET_FOLDER, 'countries.jsonl'))
 ALLOWED_EXTENSIONS = {'csv'}
+# Above this many rows the pairplot draws binned densities instead of every point
+PAIRPLOT_DENSITY_THRESHOLD = int(os.environ.get('PAIRPLOT_DENSITY_THRESHOLD', 5000))
+PAIRPLOT_DENSITY_BINS = 60
+# Share of rows held out to score models
+TEST_SHARE = 0.2
+BATCH_CHUNK_SIZE = 10000
+# Largest chunk_size /api/predict/batch accepts, so a request cannot undo the bounded memory
+BATCH_MAX_CHUNK_SIZE = BATCH_CHUNK_SIZE * 10
+# Above this many rows sklearn's compiled tree walk beats the NumPy CompactForest
+COMPACT_PREDICT_MAX_ROWS = 500
+# Most rows /api/datasets/<id>/rows returns in one response
+QUERY_MAX_ROWS = 100000
+# Longest forecast /api/datasets/<id>/trends will extrapolate, in years
+TREND_MAX_HORIZON = 10
+# Share of a tuning time budget kept back for refitting the winner on all training rows
+TUNING_REFIT_SHARE = 0.25
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# /api/upload/chunked never holds a whole file in memory, so it accepts far more
+app.config['CHUNKED_MAX_CONTENT_LENGTH'] = int(os.environ.get('CHUNKED_MAX_CONTENT_LENGTH', 4 * 1024 ** 3))
+app.config['CHUNK_ROWS'] = int(os.environ.get('CHUNK_ROWS', 100000))
+app.config['CHUNKED_SAMPLE_ROWS'] = int(os.environ.get('CHUNKED_SAMPLE_ROWS', 50000))
+app.config['RESULT_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 16))
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['CHART_WORKERS'] = int(os.environ.get('CHART_WORKERS', min(5, os.cpu_count() or 1)))
+app.config['CHART_TIMEOUT'] = float(os.environ.get('CHART_TIMEOUT', 60))
+app.config['CHART_STORE_MAX_RESULTS'] = int(os.environ.get('CHART_STORE_MAX_RESULTS', 200))
+app.config['CHART_CACHE_MAX_AGE'] = 365 * 24 * 60 * 60  # chart URLs are content-addressed
+app.config['MODEL_REGISTRY_MAX_LOADED'] = int(os.environ.get('MODEL_REGISTRY_MAX_LOADED', 4))
+app.config['MODEL_REGISTRY_MAX_MODELS'] = int(os.environ.get('MODEL_REGISTRY_MAX_MODELS', 50))
+app.config['MODEL_N_ESTIMATORS'] = int(os.environ.get('MODEL_N_ESTIMATORS', 100))
+app.config['MODEL_N_JOBS'] = int(os.environ.get('MODEL_N_JOBS', -1))  # -1 uses every core
+app.config['MODEL_ENGINE'] = os.environ.get('MODEL_ENGINE', 'random_forest')  # or 'auto'
+app.config['MODEL_TIME_BUDGET'] = float(os.environ.get('MODEL_TIME_BUDGET', 30))
+app.config['CV_WORKERS'] = int(os.environ.get('CV_WORKERS', os.cpu_count() or 1))
+app.config['IMPORTANCE_WORKERS'] = int(os.environ.get('IMPORTANCE_WORKERS', min(4, os.cpu_count() or 1)))
+app.config['IMPORTANCE_REPEATS'] = int(os.environ.get('IMPORTANCE_REPEATS', 5))
+app.config['TUNING_WORKERS'] = int(os.environ.get('TUNING_WORKERS', os.cpu_count() or 1))
+app.config['TUNING_MAX_TIME_BUDGET'] = float(os.environ.get('TUNING_MAX_TIME_BUDGET', 600))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+app.config['JOB_QUEUE_DEPTH'] = int(os.environ.get('JOB_QUEUE_DEPTH', 4))
 
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Per-worker cache of analysis results keyed by the uploaded file contents
+result_cache = ResultCache(
+    max_entries=app.config['RESULT_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['RESULT_CACHE_MAX_BYTES']
+)
+
+# Charts are rendered concurrently in worker processes
+chart_executor = ChartExecutor(
+    max_workers=app.config['CHART_WORKERS'],
+    timeout=app.config['CHART_TIMEOUT']
+)
+
+# Rendered charts are served from disk so any worker can answer for any result
+chart_store = ChartStore(CHART_FOLDER, max_results=app.config['CHART_STORE_MAX_RESULTS'])
+
+# Trained models are persisted so /api/predict can score without retraining
+model_registry = ModelRegistry(MODEL_FOLDER, max_loaded=app.config['MODEL_REGISTRY_MAX_LOADED'],
+                               max_models=app.config['MODEL_REGISTRY_MAX_MODELS'])
+
+# Processed datasets are kept in a columnar store and loaded memory-mapped
+dataset_store = DatasetStore(DATASET_FOLDER)
+
+# Permutation importances are scored in worker processes and cached per model
+importance_service = PermutationImportance(model_registry, max_workers=app.config['IMPORTANCE_WORKERS'],
+                                           n_repeats=app.config['IMPORTANCE_REPEATS'])
+
+# Cross-validation folds run in worker processes; their scores are cached on disk
+cross_validator = CrossValidator(EVALUATION_FOLDER, max_workers=app.config['CV_WORKERS'])
+
+# Per-country trend fits for every indicator, cached per dataset
+trend_store = TrendStore(TREND_FOLDER)
+
+# Sorted (country, year) row indexes for slice queries, built once per dataset
+index_store = IndexStore(INDEX_FOLDER)
+
+# Stable country codes shared by every upload, dataset and model
+country_dictionary = CountryDictionary(COUNTRY_DICTIONARY_PATH)
+
+# Background analyses run on a bounded pool; excess submissions are rejected
+job_manager = JobManager(JOB_FOLDER, max_workers=app.config['JOB_WORKERS'],
+                         max_queue=app.config['JOB_QUEUE_DEPTH'])
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def process_mental_health_data(df1, df2):
     """Process mental health data similar to the notebook logic"""
     try:
-        # Merge the datasets
-        df = pd.merge(df1, df2, on=['Entity', 'Year', 'Code'])
-        
-        # Remove rows with missing values
-        df = df.dropna()
-        
-        # Drop the Code column
-        df = df.drop("Code", axis=1)
-        
-        # Rename columns for better readability
-        column_mapping = {
-            'Entity': 'Country',
-            'Year': 'Year',
-            'DALYs (Disability-Adjusted Life Years) - Mental disorders - Sex: Both - Age: All Ages (Percent)': 'mental_fitness',
-            'Prevalence - Schizophrenia - Sex: Both - Age: Age-standardized (Percent)': 'Schizophrenia',
-            'Prevalence - Bipolar disorder - Sex: Both - Age: Age-standardized (Percent)': 'Bipolar_disorder',
-            'Prevalence - Eating disorders - Sex: Both - Age: Age-standardized (Percent)': 'Eating_disorder',
-            'Prevalence - Anxiety disorders - Sex: Both - Age: Age-standardized (Percent)': 'Anxiety',
-            'Prevalence - Drug use disorders - Sex: Both - Age: Age-standardized (Percent)': 'drug_usage',
-            'Prevalence - Depressive disorders - Sex: Both - Age: Age-standardized (Percent)': 'depression',
-            'Prevalence - Alcohol use disorders - Sex: Both - Age: Age-standardized (Percent)': 'alcohol'
-        }
-        
-        df = df.rename(columns=column_mapping)
-        
-        # Encode categorical variables (but preserve Year as numeric)
-        le = LabelEncoder()
-        for col in df.columns:
-            if df[col].dtype == 'object' and col != 'Year':
-                df[col] = le.fit_transform(df[col])
-        
-        # Ensure Year is numeric
-        if 'Year' in df.columns:
-            df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-        
-        return df, None
+        # Merge the datasets on packed integer keys, removing rows with
+        # missing values and the Code column in the same pass
+        df = merge_datasets(df1, df2)
+        return prepare_merged_data(df), None
     except Exception as e:
         return None, str(e)
 
-def train_model(df):
-    """Train the Random Forest model"""
+def prepare_merged_data(df):
+    """Rename and encode the columns of a merged frame (or of one merged chunk)"""
+    # Rename columns for better readability
+    df = df.rename(columns=COLUMN_MAPPING)
+    
+    # Encode categorical variables (but preserve Year as numeric).
+    # Countries use the persistent dictionary so their codes are the same
+    # in every dataset; any other text column is label-encoded per upload
+    le = LabelEncoder()
+    encodings = {}
+    for col in df.columns:
+        if col == 'Country':
+            df[col] = country_dictionary.encode(df[col])
+        elif not pd.api.types.is_numeric_dtype(df[col]) and col != 'Year':
+            df[col] = le.fit_transform(df[col])
+            encodings[col] = [str(c) for c in le.classes_]
+    
+    # Keep the label order so predictions can accept the original names
+    df.attrs['encodings'] = encodings
+    
+    # Ensure Year is numeric
+    if 'Year' in df.columns:
+        df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    
+    return df
+
+def test_rows_mask(df):
+    """True for the rows held out for testing, about TEST_SHARE of them
+
+    The side a row falls on depends only on a hash of its (Country, Year),
+    so it stays the same when years are appended: rows a parent model was
+    trained on never land in the test set of a model grown from it.
+    """
+    keys = (df['Country'].to_numpy(dtype=np.int64).view(np.uint64) << np.uint64(32)) ^ \
+        df['Year'].to_numpy(dtype=np.int64).view(np.uint64)
+    # splitmix64 finalizer: every key bit affects the top 53 bits used below
+    keys = keys + np.uint64(0x9E3779B97F4A7C15)
+    keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    keys = keys ^ (keys >> np.uint64(31))
+    return (keys >> np.uint64(11)) * 2.0 ** -53 < TEST_SHARE
+
+def split_dataset(df):
+    """The fixed 80/20 (X_train, X_test, y_train, y_test) split models are scored on"""
+    X = df.drop('mental_fitness', axis=1)
+    y = df['mental_fitness']
+    test = test_rows_mask(df)
+    return X[~test], X[test], y[~test], y[test]
+
+def train_model(df, n_estimators=None, n_jobs=None, base_model=None, engine=None, time_budget=None, params=None):
+    """Train the regression model
+
+    engine is one of model_engines.ENGINES, or 'auto' to fit every engine in
+    parallel within time_budget seconds and keep the one with the best test
+    R². Random forest trees are built on n_jobs threads. With base_model,
+    n_estimators new trees are added to a copy of that forest (warm start).
+    params are estimator parameters for a single engine (e.g. from tuning).
+    """
     try:
-        X = df.drop('mental_fitness', axis=1)
-        y = df['mental_fitness']
-        
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=2)
-        
-        rf = RandomForestRegressor()
-        rf.fit(X_train, y_train)
-        
-        # Model evaluation
-        y_train_pred = rf.predict(X_train)
-        y_test_pred = rf.predict(X_test)
-        
-        train_mse = mean_squared_error(y_train, y_train_pred)
-        train_rmse = np.sqrt(train_mse)
-        train_r2 = r2_score(y_train, y_train_pred)
-        
-        test_mse = mean_squared_error(y_test, y_test_pred)
-        test_rmse = np.sqrt(test_mse)
-        test_r2 = r2_score(y_test, y_test_pred)
+        n_estimators = n_estimators or app.config['MODEL_N_ESTIMATORS']
+        n_jobs = n_jobs or app.config['MODEL_N_JOBS']
+        engine = engine or app.config['MODEL_ENGINE']
+        split = split_dataset(df)
+        
+        engines = None
+        if base_model is not None:
+            # Copy so the registered (possibly memory-mapped) model is left untouched
+            rf = copy.copy(base_model)
+            rf.estimators_ = list(base_model.estimators_)
+            rf.set_params(warm_start=True, n_jobs=n_jobs,
+                          n_estimators=len(base_model.estimators_) + n_estimators)
+            result = fit_engine('random_forest', split, model=rf)
+            rf.set_params(warm_start=False)
+        elif engine == AUTO_ENGINE:
+            time_budget = time_budget or app.config['MODEL_TIME_BUDGET']
+            result, engines = select_engine(split, time_budget=time_budget, n_estimators=n_estimators)
+            if result is None:
+                return None, f'No model engine finished within {time_budget} seconds'
+        else:
+            result = fit_engine(engine, split, n_estimators, n_jobs, params=params)
         
-        return {
-            'model': rf,
-            'train_metrics': {
-                'mse': train_mse,
-                'rmse': train_rmse,
-                'r2': train_r2
-            },
-            'test_metrics': {
-                'mse': test_mse,
-                'rmse': test_rmse,
-                'r2': test_r2
-            }
-        }, None
+        return training_result(result, split, engines), None
     except Exception as e:
         return None, str(e)
 
-def create_correlation_heatmap(df):
-    """Create correlation heatmap"""
+def training_result(result, split, engines=None):
+    """The train_model result for a fit_engine result on split"""
+    X_train, _, y_train, _ = split
+    return {
+        'model': result['model'],
+        'engine': result['engine'],
+        'engines': engines,
+        'feature_importances': feature_importances(result['model'], X_train, y_train),
+        'train_seconds': result['fit_seconds'],
+        'predict_us_per_row': result['predict_us_per_row'],
+        'train_metrics': result['train_metrics'],
+        'test_metrics': result['test_metrics']
+    }
+
+def create_correlation_heatmap(aggregates):
+    """Create correlation heatmap from the stored co-moment accumulators"""
     try:
         plt.figure(figsize=(12, 8))
-        correlation_matrix = df.corr()
+        correlation = aggregate_chart_data(aggregates)['correlation']
+        correlation_matrix = pd.DataFrame(correlation['matrix'], index=correlation['columns'],
+                                          columns=correlation['columns'], dtype=float)
         sns.heatmap(correlation_matrix, annot=True, cmap='Blues', center=0)
         plt.title('Mental Health Data Correlation Matrix')
         plt.tight_layout()
         
-        # Convert plot to base64 string
+        # Encode plot as PNG bytes
         img_buffer = io.BytesIO()
         plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        img_png = img_buffer.getvalue()
         plt.close()
         
-        return img_base64
+        return img_png
     except Exception as e:
         print(f"Error creating correlation heatmap: {e}")
         return None
 
-def create_pairplot(df):
-    """Create pairplot for data visualization"""
+def create_pairplot(df, density=None):
+    """Create pairplot for data visualization
+
+    When density is None it is switched on automatically for frames larger
+    than PAIRPLOT_DENSITY_THRESHOLD rows.
+    """
     try:
-        plt.figure(figsize=(15, 12))
-        
         # Select numeric columns for pairplot
         numeric_cols = df.select_dtypes(include=[np.number]).columns
         df_numeric = df[numeric_cols]
         
-        # Create pairplot
-        sns.pairplot(df_numeric, corner=True)
-        plt.suptitle('Mental Health Data Pairplot', y=1.02)
-        plt.tight_layout()
+        if density is None:
+            density = len(df_numeric) > PAIRPLOT_DENSITY_THRESHOLD
         
-        # Convert plot to base64 string
+        if density:
+            create_density_pairplot(df_numeric)
+        else:
+            plt.figure(figsize=(15, 12))
+            
+            # Create pairplot
+            sns.pairplot(df_numeric, corner=True)
+            plt.suptitle('Mental Health Data Pairplot', y=1.02)
+            plt.tight_layout()
+        
+        # Encode plot as PNG bytes
         img_buffer = io.BytesIO()
         plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close()
+        img_png = img_buffer.getvalue()
+        plt.close('all')
         
-        return img_base64
+        return img_png
     except Exception as e:
         print(f"Error creating pairplot: {e}")
         return None
 
-def create_distribution_histogram(df):
-    """Create distribution histogram for mental health indicators"""
+def create_density_pairplot(df_numeric, bins=PAIRPLOT_DENSITY_BINS):
+    """Draw a corner pairplot of binned 2D histograms
+
+    Each variable pair is reduced to a bins x bins count grid with a single
+    vectorized np.histogram2d call, so drawing cost does not grow with the
+    number of rows.
+    """
+    columns = list(df_numeric.columns)
+    values = df_numeric.to_numpy(dtype=float)
+    values = values[np.isfinite(values).all(axis=1)]
+    n = len(columns)
+    
+    # Fixed per-column ranges keep every panel in a row/column aligned
+    ranges = []
+    for i in range(n):
+        low, high = (values[:, i].min(), values[:, i].max()) if len(values) else (0.0, 1.0)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        ranges.append((low, high))
+    
+    fig, axes = plt.subplots(n, n, figsize=(2.5 * n, 2.5 * n), squeeze=False)
+    for i in range(n):
+        for j in range(n):
+            ax = axes[i, j]
+            if j > i:
+                ax.set_visible(False)
+                continue
+            
+            if i == j:
+                counts, edges = np.histogram(values[:, i], bins=bins, range=ranges[i])
+                ax.stairs(counts, edges, fill=True, alpha=0.7)
+            else:
+                counts, _, _ = np.histogram2d(values[:, j], values[:, i], bins=bins,
+                                              range=[ranges[j], ranges[i]])
+                # Empty cells stay blank; counts are log-scaled so sparse regions remain visible
+                counts = np.ma.masked_equal(counts.T, 0)
+                if counts.count():
+                    ax.imshow(counts, origin='lower', aspect='auto', cmap='viridis',
+                              extent=[*ranges[j], *ranges[i]],
+                              norm=matplotlib.colors.LogNorm(vmin=1, vmax=counts.max()))
+                ax.set_ylim(ranges[i])
+            ax.set_xlim(ranges[j])
+            
+            # Label only the outer edges, like seaborn's corner pairplot
+            if i == n - 1:
+                ax.set_xlabel(columns[j])
+            else:
+                ax.set_xticklabels([])
+            if j == 0 and i > 0:
+                ax.set_ylabel(columns[i])
+            else:
+                ax.set_yticklabels([])
+    
+    fig.suptitle('Mental Health Data Pairplot (binned density)', y=1.02)
+    fig.tight_layout()
+    return fig
+
+def create_distribution_histogram(aggregates):
+    """Create distribution histogram for mental health indicators, from the stored bin counts"""
     try:
         # Select key mental health indicators
         key_indicators = ['mental_fitness', 'depression', 'anxiety', 'drug_usage', 'alcohol']
-        available_indicators = [col for col in key_indicators if col in df.columns]
+        distribution = aggregate_chart_data(aggregates)['distribution']
+        available_indicators = [col for col in key_indicators if col in distribution]
         
         if not available_indicators:
             return None
@@ -178,15 +394,17 @@ def create_distribution_histogram(df):
         
         for i, indicator in enumerate(available_indicators[:6]):
             if i < len(axes):
-                axes[i].hist(df[indicator], bins=30, alpha=0.7, color=plt.cm.viridis(i/len(available_indicators)), edgecolor='black')
+                edges = np.asarray(distribution[indicator]['edges'], dtype=float)
+                axes[i].hist(edges[:-1], bins=edges, weights=distribution[indicator]['counts'], alpha=0.7,
+                             color=plt.cm.viridis(i/len(available_indicators)), edgecolor='black')
                 axes[i].set_title(f'{indicator.replace("_", " ").title()} Distribution', fontsize=12, fontweight='bold')
                 axes[i].set_xlabel('Value')
                 axes[i].set_ylabel('Frequency')
                 axes[i].grid(True, alpha=0.3)
                 
                 # Add statistics
-                mean_val = df[indicator].mean()
-                std_val = df[indicator].std()
+                mean_val = distribution[indicator]['mean']
+                std_val = distribution[indicator]['std'] or 0.0
                 axes[i].axvline(mean_val, color='red', linestyle='--', linewidth=2, label=f'Mean: {mean_val:.3f}')
                 axes[i].axvline(mean_val + std_val, color='orange', linestyle=':', alpha=0.7, label=f'±1σ: {std_val:.3f}')
                 axes[i].axvline(mean_val - std_val, color='orange', linestyle=':', alpha=0.7)
@@ -199,49 +417,39 @@ def create_distribution_histogram(df):
         plt.suptitle('Mental Health Indicators Distribution Analysis', fontsize=16, fontweight='bold', y=0.98)
         plt.tight_layout()
         
-        # Convert plot to base64 string
+        # Encode plot as PNG bytes
         img_buffer = io.BytesIO()
         plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        img_png = img_buffer.getvalue()
         plt.close()
         
-        return img_base64
+        return img_png
     except Exception as e:
         print(f"Error creating distribution histogram: {e}")
         return None
 
-def create_time_series_analysis(df):
-    """Create time series analysis showing trends over years"""
+def create_time_series_analysis(aggregates):
+    """Create time series analysis showing trends over years, from the per-year cube"""
     try:
-        # Check if Year column exists and has enough data
-        if 'Year' not in df.columns:
+        groups = aggregate_groups(aggregates, 'Year')
+        if groups is None:
             print("Year column not found in data")
             return None
         
-        # Remove any rows with invalid year data
-        df_clean = df.dropna(subset=['Year']).copy()
-        if len(df_clean) == 0:
-            print("No valid year data found")
+        if len(groups['keys']) < 2:
+            print(f"Not enough unique years for time series analysis. Found: {len(groups['keys'])}")
             return None
         
-        # Ensure Year is numeric and has enough unique values
-        df_clean['Year'] = pd.to_numeric(df_clean['Year'], errors='coerce')
-        df_clean = df_clean.dropna(subset=['Year'])
-        
-        if df_clean['Year'].nunique() < 2:
-            print(f"Not enough unique years for time series analysis. Found: {df_clean['Year'].nunique()}")
-            return None
-        
-        # Group by year and calculate mean values for available columns
+        # Mean values per year for available columns
         available_columns = ['mental_fitness', 'depression', 'anxiety', 'drug_usage', 'alcohol']
-        existing_columns = [col for col in available_columns if col in df_clean.columns]
+        existing_columns = [col for col in available_columns if col in groups['indicators']]
         
         if not existing_columns:
             print("No suitable columns found for time series analysis")
             return None
         
-        yearly_data = df_clean.groupby('Year')[existing_columns].mean().reset_index()
+        yearly_data = pd.DataFrame({col: groups['indicators'][col]['mean'] for col in existing_columns}, dtype=float)
+        yearly_data.insert(0, 'Year', groups['keys'])
         
         # Create subplots based on available data
         num_plots = min(len(existing_columns), 4)
@@ -287,14 +495,13 @@ def create_time_series_analysis(df):
         plt.suptitle('Mental Health Trends Analysis Over Time', fontsize=16, fontweight='bold', y=0.98)
         plt.tight_layout()
         
-        # Convert plot to base64 string
+        # Encode plot as PNG bytes
         img_buffer = io.BytesIO()
         plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        img_png = img_buffer.getvalue()
         plt.close()
         
-        return img_base64
+        return img_png
     except Exception as e:
         print(f"Error creating time series analysis: {e}")
         import traceback
@@ -306,7 +513,9 @@ def create_feature_importance_chart(df, model):
     try:
         # Get feature importance from the model
         feature_names = [col for col in df.columns if col != 'mental_fitness']
-        importance_scores = model.feature_importances_
+        # Permutation importances can be slightly negative for features the
+        # model ignores; those count as no importance at all
+        importance_scores = np.clip(model.feature_importances_, 0, None)
         
         # Create DataFrame for better handling
         importance_df = pd.DataFrame({
@@ -333,6 +542,8 @@ def create_feature_importance_chart(df, model):
         # Add percentage labels
         total_importance = importance_df['Importance'].sum()
         for i, (bar, value) in enumerate(zip(bars, importance_df['Importance'])):
+            if total_importance <= 0:
+                break
             percentage = (value / total_importance) * 100
             plt.text(value/2, bar.get_y() + bar.get_height()/2, 
                     f'{percentage:.1f}%', va='center', ha='center', 
@@ -340,18 +551,293 @@ def create_feature_importance_chart(df, model):
         
         plt.tight_layout()
         
-        # Convert plot to base64 string
+        # Encode plot as PNG bytes
         img_buffer = io.BytesIO()
         plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        img_png = img_buffer.getvalue()
         plt.close()
         
-        return img_base64
+        return img_png
     except Exception as e:
         print(f"Error creating feature importance chart: {e}")
         return None
 
+def analyze_data(df1, df2, result_id, render_charts=True, progress=None):
+    """Run the full pipeline: process, train, visualize and summarize
+
+    Rendered charts are written to the chart store under result_id; the
+    returned result only lists their names. With render_charts=False only
+    the numeric chart aggregates are computed and matplotlib is skipped.
+    progress, if given, is called with the name of each stage as it starts.
+    """
+    return collect_analysis(iter_analysis(df1, df2, result_id, render_charts), progress)
+
+def analyze_processed_data(processed_df, result_id, render_charts=True, progress=None):
+    """Like analyze_data, for an already processed (e.g. stored) dataset"""
+    return collect_analysis(iter_processed_analysis(processed_df, result_id, render_charts), progress)
+
+def collect_analysis(events, progress=None):
+    """Drain a pipeline event stream into (result, error)"""
+    for event, payload in events:
+        if event == 'error':
+            return None, payload
+        if event == 'stage' and progress:
+            progress(payload)
+        if event == 'result':
+            return payload, None
+    return None, 'Analysis produced no result'
+
+def iter_analysis(df1, df2, result_id, render_charts=True):
+    """Run the pipeline as a generator of (event, payload) pairs
+
+    Events are emitted as soon as each piece is ready: 'stage' when a stage
+    starts, then 'statistics', 'model', one 'chart' per rendered chart as it
+    completes, and finally 'result' (or 'error').
+    """
+    # Process data
+    yield 'stage', 'merge'
+    processed_df, error = process_mental_health_data(df1, df2)
+    if error:
+        yield 'error', f'Data processing error: {error}'
+        return
+    
+    # Keep the processed frame so later requests can skip parsing and merging;
+    # its aggregates are computed once here and every view reads them
+    aggregates = compute_aggregates(processed_df)
+    try:
+        dataset_store.save(result_id, processed_df, extra={'aggregates': aggregates})
+    except Exception as e:
+        print(f"Error storing dataset: {e}")
+    
+    yield from iter_processed_analysis(processed_df, result_id, render_charts, aggregates)
+
+def iter_processed_analysis(processed_df, result_id, render_charts=True, aggregates=None, sample_rows=None,
+                            chart_key=None):
+    """Pipeline events for a processed dataset: statistics, training and charts
+
+    sample_rows is set when processed_df is a sample of the dataset's rows;
+    the model is then registered under a config of its own. Charts are
+    stored under chart_key (default result_id), so differently drawn charts
+    of the same dataset never share an immutable URL.
+    """
+    chart_key = chart_key or result_id
+    if aggregates is None:
+        aggregates = dataset_aggregates(result_id) or compute_aggregates(processed_df)
+    
+    # Get basic statistics
+    stats = aggregate_statistics(aggregates)
+    yield 'statistics', stats
+    
+    # Train model, unless this dataset and config already have one registered
+    yield 'stage', 'train'
+    config = {'engine': app.config['MODEL_ENGINE'], 'n_estimators': app.config['MODEL_N_ESTIMATORS']}
+    if config['engine'] == AUTO_ENGINE:
+        config['time_budget'] = app.config['MODEL_TIME_BUDGET']
+    if sample_rows is not None:
+        config['sample_rows'] = sample_rows
+    model_id = model_key(result_id, config)
+    model_result = registered_result(model_id)
+    if model_result is None:
+        model_result, error = train_model(processed_df)
+        if error:
+            yield 'error', f'Model training error: {error}'
+            return
+        model_id = register_model(result_id, model_result['model'], processed_df,
+                                  {'train': model_result['train_metrics'], 'test': model_result['test_metrics']},
+                                  config, extra=training_details(model_result))
+    
+    model_metrics = {
+        'train': model_result['train_metrics'],
+        'test': model_result['test_metrics']
+    }
+    yield 'model', {'model_id': model_id, 'engine': model_result['engine'], 'model_metrics': model_metrics}
+    
+    # Charts only need the importances; pickling a whole forest for the chart
+    # workers would cost tens of megabytes
+    scores = model_importances(model_id, model_result['model'], processed_df)
+    if scores is None:
+        scores = model_result['feature_importances']
+    importances = SimpleNamespace(feature_importances_=np.asarray(scores))
+    chart_names = None
+    timed_out_charts = []
+    if render_charts:
+        yield 'stage', 'render'
+        chart_names = []
+        for name, img, timed_out in chart_executor.render_iter({
+            'correlation_heatmap': (create_correlation_heatmap, (aggregates,)),
+            'pairplot': (create_pairplot, (processed_df,)),
+            'distribution_histogram': (create_distribution_histogram, (aggregates,)),
+            'time_series_analysis': (create_time_series_analysis, (aggregates,)),
+            'feature_importance': (create_feature_importance_chart, (processed_df, importances))
+        }):
+            # Handle visualization errors
+            if timed_out:
+                timed_out_charts.append(name)
+            if not img:
+                continue
+            chart_store.save(chart_key, {name: img})
+            chart_names.append(name)
+            yield 'chart', name
+    
+    yield 'result', {
+        'processed_df': processed_df,
+        'statistics': stats,
+        'model_metrics': model_metrics,
+        'model_id': model_id,
+        'chart_data': dict(aggregate_chart_data(aggregates), feature_importance=feature_importance_data(
+            [col for col in processed_df.columns if col != 'mental_fitness'], importances.feature_importances_)),
+        'charts': chart_names,
+        'chart_key': chart_key,
+        'dataset_id': result_id,
+        'timed_out_charts': timed_out_charts
+    }
+
+def iter_chunked_analysis(stream1, stream2, result_id, render_charts=True):
+    """Like iter_analysis for CSV files larger than memory
+
+    Both files are read CHUNK_ROWS rows at a time and joined chunk by chunk
+    on their sorted (Entity, Year) keys. Each processed chunk is written to
+    the dataset store, added to the aggregates and offered to a random
+    sample of at most CHUNKED_SAMPLE_ROWS rows, then dropped. Statistics and
+    the aggregate charts cover every row; the model and the pairplot use the
+    sample, so peak memory does not grow with the input.
+    """
+    chunk_rows = app.config['CHUNK_ROWS']
+    sample = ReservoirSample(app.config['CHUNKED_SAMPLE_ROWS'])
+    writer = dataset_store.writer(result_id)
+    ingest = None
+    
+    if writer is None:
+        # Stored before: only the sample has to be drawn again, from the memory-mapped rows
+        yield 'stage', 'load'
+        aggregates = dataset_aggregates(result_id)
+        stored = dataset_store.load(result_id)
+        for start in range(0, len(stored), chunk_rows):
+            sample.update(stored.iloc[start:start + chunk_rows])
+    else:
+        yield 'stage', 'merge'
+        start_time = time.perf_counter()
+        builder = None
+        try:
+            (chunks1, schema1), (chunks2, schema2) = (read_csv_chunks(stream, chunk_rows) for stream in (stream1, stream2))
+            for merged in merge_sorted_chunks(chunks1, chunks2):
+                chunk = prepare_merged_data(merged)
+                if chunk.attrs['encodings']:
+                    raise ValueError(f"Chunked processing cannot label-encode {list(chunk.attrs['encodings'])}")
+                builder = builder or AggregateBuilder(empty_aggregates(chunk.columns))
+                builder.update(chunk)
+                writer.write(chunk)
+                sample.update(chunk)
+            if builder is None:
+                raise ValueError('The files have no complete (Entity, Year) rows in common')
+            aggregates = builder.result()
+            writer.close(extra={'aggregates': aggregates, 'chunked': True})
+        except Exception as e:
+            writer.abort()
+            yield 'error', f'Data processing error: {str(e)}'
+            return
+        # The histograms followed the range as it grew; count them again on the full
+        # range from the memory-mapped rows so they match an in-memory upload's
+        try:
+            stored = dataset_store.load(result_id)
+            aggregates = recount_histograms(aggregates, (stored.iloc[start:start + chunk_rows]
+                                                         for start in range(0, len(stored), chunk_rows)))
+            dataset_store.update_metadata(result_id, {'aggregates': aggregates})
+        except Exception as e:
+            print(f"Error recounting histograms: {e}")
+        seconds = time.perf_counter() - start_time
+        ingest = [{'schema': schema, 'engine': 'c', 'chunked': True, 'bytes': stream.seek(0, 2), 'seconds': seconds}
+                  for schema, stream in ((schema1, stream1), (schema2, stream2))]
+    
+    # A model trained on a sample must not share its id with one trained on every row,
+    # nor charts drawn from the sample and merged aggregates their URLs with in-memory ones
+    sample_rows = sample.size if sample.seen > sample.size else None
+    for event, payload in iter_processed_analysis(sample.frame(), result_id, render_charts, aggregates,
+                                                  sample_rows, chart_key=chunked_key(result_id)):
+        if event == 'result':
+            payload['ingest'] = ingest
+            payload['sample_rows'] = min(sample.seen, sample.size)
+        yield event, payload
+
+def chunked_key(result_id):
+    """Key for the results and charts of a chunked analysis of dataset result_id"""
+    return f'{result_id}-chunked'
+
+def model_importances(model_id, model, df):
+    """Held-out permutation importances of a registered model, from cache when possible"""
+    if model_id is None:
+        return None
+    try:
+        _, X_test, _, y_test = split_dataset(df)
+        return importance_service.compute(model_id, model, X_test, y_test, X_test.columns)['mean']
+    except Exception as e:
+        print(f"Error computing permutation importance: {e}")
+        return None
+
+def training_details(model_result):
+    """Model metadata describing how a train_model result was produced"""
+    return {
+        'engine': model_result['engine'],
+        'engines': model_result['engines'],
+        'train_seconds': model_result['train_seconds'],
+        'predict_us_per_row': model_result['predict_us_per_row'],
+        'feature_importances': [float(v) for v in model_result['feature_importances']]
+    }
+
+def model_key(result_id, config):
+    """The id a model trained on a dataset with a training config is registered under"""
+    return content_key(result_id.encode(), json.dumps(config, sort_keys=True).encode())[:24]
+
+def registered_result(model_id):
+    """A train_model result rebuilt from a registered model, or None if it is not registered"""
+    meta = model_registry.metadata(model_id)
+    if meta is None or 'feature_importances' not in meta:
+        return None
+    loaded = model_registry.load(model_id)
+    if loaded is None:
+        return None
+    return {
+        'model': loaded[0],
+        'engine': meta['engine'],
+        'engines': meta.get('engines'),
+        'feature_importances': np.asarray(meta['feature_importances']),
+        'train_seconds': meta.get('train_seconds'),
+        'predict_us_per_row': meta.get('predict_us_per_row'),
+        'train_metrics': meta['metrics']['train'],
+        'test_metrics': meta['metrics']['test']
+    }
+
+def register_model(result_id, model, df, metrics, config=None, extra=None):
+    """Persist a trained model; its id is derived from the dataset and training config"""
+    config = config or {'engine': 'random_forest'}
+    model_id = model_key(result_id, config)
+    features = [col for col in df.columns if col != 'mental_fitness']
+    try:
+        # Forests are also exported as flat arrays for low-latency prediction
+        compact = CompactForest.from_sklearn(model) if isinstance(model, RandomForestRegressor) else None
+        model_registry.register(model_id, model, features, metrics, extra=dict({
+            'result_id': result_id,
+            'config': config,
+            'encodings': df.attrs.get('encodings', {})
+        }, **(extra or {})), compact=compact)
+    except Exception as e:
+        # Serving the analysis matters more than persisting the model
+        print(f"Error registering model: {e}")
+        return None
+    return model_id
+
+def chart_payload(result_id, names, inline=False):
+    """Map chart names to their URLs, or to base64 PNG data when inline"""
+    payload = {}
+    for name in names:
+        if inline:
+            png = chart_store.load(result_id, name)
+            if png:
+                payload[name] = base64.b64encode(png).decode()
+        else:
+            payload[name] = url_for('chart_image', result_id=result_id, name=name)
+    return payload
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -360,116 +846,1135 @@ def index():
 def favicon():
     return '', 204  # No content response for favicon
 
+def read_upload_pair():
+    """Validate the file1/file2 upload fields and return their raw bytes"""
+    files, error = upload_pair_files()
+    if error:
+        return None, error
+    return (files[0].read(), files[1].read()), None
+
+def upload_pair_files():
+    """Validate the file1/file2 upload fields and return them unread"""
+    if 'file1' not in request.files or 'file2' not in request.files:
+        return None, 'Two CSV files are required'
+    
+    file1 = request.files['file1']
+    file2 = request.files['file2']
+    
+    if file1.filename == '' or file2.filename == '':
+        return None, 'No files selected'
+    
+    if not (allowed_file(file1.filename) and allowed_file(file2.filename)):
+        return None, 'Only CSV files are allowed'
+    
+    return (file1, file2), None
+
+def get_cached_result(cache_key, data_only):
+    """Return a cached result that can serve the request, or None"""
+    result = result_cache.get(cache_key)
+    if result is None:
+        return None
+    # Charts that were never rendered or were pruned from the store have to be rendered again
+    if not data_only and (result['charts'] is None or
+                          not chart_store.has_all(result.get('chart_key') or cache_key, result['charts'])):
+        return None
+    return result
+
+def run_analysis(data1, data2, cache_key, data_only, progress=None):
+    """Parse both payloads, run the pipeline and cache the result"""
+    progress = progress or (lambda stage: None)
+    
+    # A dataset processed earlier (by any worker) skips parsing and merging
+    processed_df = dataset_store.load(cache_key)
+    if processed_df is not None:
+        progress('load')
+        result, error = analyze_processed_data(processed_df, cache_key, render_charts=not data_only,
+                                               progress=progress)
+        ingest = None
+    else:
+        # Read CSV files
+        progress('parse')
+        df1, ingest1 = read_csv_payload(data1)
+        df2, ingest2 = read_csv_payload(data2)
+        ingest = [ingest1, ingest2]
+        
+        result, error = analyze_data(df1, df2, cache_key, render_charts=not data_only, progress=progress)
+    if error:
+        return None, error
+    result['ingest'] = ingest
+    # Don't pin a result whose charts were cut short by the render timeout
+    if not result['timed_out_charts']:
+        result_cache.put(cache_key, result)
+    return result, None
+
+def result_payload(cache_key, result, data_only, inline=False):
+    """Build the JSON-ready response data for an analysis result"""
+    dataset_id = result.get('dataset_id') or cache_key
+    data = {
+        'result_id': cache_key,
+        'dataset_id': dataset_id if dataset_store.exists(dataset_id) else None,
+        'model_id': result['model_id'],
+        'statistics': result['statistics'],
+        'model_metrics': result['model_metrics'],
+        'ingest': result.get('ingest')
+    }
+    if result.get('sample_rows') is not None:
+        data['sample_rows'] = result['sample_rows']
+    if data_only:
+        data['chart_data'] = result['chart_data']
+    else:
+        data['visualizations'] = chart_payload(result.get('chart_key') or cache_key, result['charts'], inline)
+    return data
+
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
     try:
-        if 'file1' not in request.files or 'file2' not in request.files:
-            return jsonify({'error': 'Two CSV files are required'}), 400
+        files, error = read_upload_pair()
+        if error:
+            return jsonify({'error': error}), 400
+        data1, data2 = files
         
-        file1 = request.files['file1']
-        file2 = request.files['file2']
+        # Identical uploads are served from the result cache
+        cache_key = content_key(data1, data2)
+        # format=data returns the numbers behind the charts and skips rendering
+        data_only = request.args.get('format') == 'data'
         
-        if file1.filename == '' or file2.filename == '':
-            return jsonify({'error': 'No files selected'}), 400
+        result = get_cached_result(cache_key, data_only)
+        cached = result is not None
         
-        if not (allowed_file(file1.filename) and allowed_file(file2.filename)):
-            return jsonify({'error': 'Only CSV files are allowed'}), 400
+        if not cached:
+            result, error = run_analysis(data1, data2, cache_key, data_only)
+            if error:
+                return jsonify({'error': error}), 400
         
-        # Read CSV files
-        df1 = pd.read_csv(file1)
-        df2 = pd.read_csv(file2)
+        # Charts are returned as URLs unless the client asks for inline base64
+        inline = request.args.get('charts') == 'inline'
+        data = result_payload(cache_key, result, data_only, inline)
         
-        # Process data
-        processed_df, error = process_mental_health_data(df1, df2)
-        if error:
-            return jsonify({'error': f'Data processing error: {error}'}), 400
+        return jsonify({'success': True, 'cached': cached, 'data': data})
         
-        # Train model
-        model_result, error = train_model(processed_df)
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/upload/chunked', methods=['POST'])
+def upload_files_chunked():
+    """Queue an analysis of files too large to hold in memory; returns a job id to poll
+
+    Accepts up to CHUNKED_MAX_CONTENT_LENGTH bytes. Both CSVs must be sorted
+    by Entity and Year, as OWID exports are. The analysis runs as a
+    background job (see /api/jobs) because it can take far longer than a
+    request may; the model is trained on a bounded random sample of the
+    rows, see iter_chunked_analysis.
+    """
+    try:
+        # Raise the limit for this request only, before the body is parsed
+        request.max_content_length = app.config['CHUNKED_MAX_CONTENT_LENGTH']
+        files, error = upload_pair_files()
         if error:
-            return jsonify({'error': f'Model training error: {error}'}), 400
-        
-        # Create visualizations
-        heatmap_img = create_correlation_heatmap(processed_df)
-        pairplot_img = create_pairplot(processed_df)
-        distribution_img = create_distribution_histogram(processed_df)
-        timeseries_img = create_time_series_analysis(processed_df)
-        feature_importance_img = create_feature_importance_chart(processed_df, model_result['model'])
-        
-        # Handle visualization errors
-        visualizations = {}
-        if heatmap_img:
-            visualizations['correlation_heatmap'] = heatmap_img
-        if pairplot_img:
-            visualizations['pairplot'] = pairplot_img
-        if distribution_img:
-            visualizations['distribution_histogram'] = distribution_img
-        if timeseries_img:
-            visualizations['time_series_analysis'] = timeseries_img
-        if feature_importance_img:
-            visualizations['feature_importance'] = feature_importance_img
-        
-        # Get basic statistics
-        stats = {
-            'shape': processed_df.shape,
-            'columns': list(processed_df.columns),
-            'mean_mental_fitness': float(processed_df['mental_fitness'].mean()),
-            'std_mental_fitness': float(processed_df['mental_fitness'].std()),
-            'min_mental_fitness': float(processed_df['mental_fitness'].min()),
-            'max_mental_fitness': float(processed_df['mental_fitness'].max())
-        }
+            return jsonify({'error': error}), 400
+        
+        # Shares the dataset with in-memory uploads of the same files, but not results or charts
+        cache_key = stream_key(files[0].stream, files[1].stream)
+        result_key = chunked_key(cache_key)
+        data_only = request.args.get('format') == 'data'
+        job_id = f"{result_key}-{'data' if data_only else 'charts'}"
+        
+        result = get_cached_result(result_key, data_only)
+        streams = []
+        try:
+            if result is not None:
+                status, deduplicated = job_manager.submit(job_id, lambda progress: job_result(result))
+            else:
+                # Multipart parsing spooled the files to unnamed temporary files; duplicated
+                # descriptors keep them open for the job after the request closes its own
+                streams = [os.fdopen(os.dup(f.stream.fileno()), 'rb') for f in files]
+                status, deduplicated = job_manager.submit(job_id, chunked_analysis_job, *streams,
+                                                          cache_key, data_only)
+                if not deduplicated:
+                    streams = []
+        except QueueFullError:
+            response = jsonify({'error': 'Too many analyses in progress, please retry shortly'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        finally:
+            # Only a job that was actually queued owns the streams
+            for stream in streams:
+                stream.close()
         
         return jsonify({
             'success': True,
-            'data': {
-                'statistics': stats,
-                'model_metrics': {
-                    'train': model_result['train_metrics'],
-                    'test': model_result['test_metrics']
-                },
-                'visualizations': visualizations
-            }
-        })
+            'job_id': job_id,
+            'deduplicated': deduplicated,
+            'status_url': url_for('job_status', job_id=job_id),
+            'state': status.get('state') if status else 'queued'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/api/upload/stream', methods=['POST'])
+def upload_files_stream():
+    """Like /api/upload, but streams each section as Server-Sent Events when it is ready
+
+    Emits 'statistics', 'model', one 'chart' per chart (with its URL) and a
+    final 'done' event; failures are reported as an 'error' event.
+    """
+    files, error = read_upload_pair()
+    if error:
+        return jsonify({'error': error}), 400
+    data1, data2 = files
+    cache_key = content_key(data1, data2)
+    cached_result = get_cached_result(cache_key, False)
+    
+    def generate():
+        try:
+            if cached_result is not None:
+                yield sse_event('statistics', cached_result['statistics'])
+                yield sse_event('model', {'model_id': cached_result['model_id'],
+                                          'model_metrics': cached_result['model_metrics']})
+                for name, url in chart_payload(cached_result.get('chart_key') or cache_key,
+                                               cached_result['charts']).items():
+                    yield sse_event('chart', {'name': name, 'url': url})
+                yield sse_event('done', {'result_id': cache_key, 'cached': True})
+                return
+            
+            processed_df = dataset_store.load(cache_key)
+            if processed_df is not None:
+                yield sse_event('stage', {'stage': 'load'})
+                ingest = None
+                events = iter_processed_analysis(processed_df, cache_key)
+            else:
+                yield sse_event('stage', {'stage': 'parse'})
+                df1, ingest1 = read_csv_payload(data1)
+                df2, ingest2 = read_csv_payload(data2)
+                ingest = [ingest1, ingest2]
+                yield sse_event('ingest', ingest)
+                events = iter_analysis(df1, df2, cache_key)
+            
+            for event, payload in events:
+                if event == 'error':
+                    yield sse_event('error', {'error': payload})
+                    return
+                if event == 'stage':
+                    yield sse_event('stage', {'stage': payload})
+                elif event in ('statistics', 'model'):
+                    yield sse_event(event, payload)
+                elif event == 'chart':
+                    yield sse_event('chart', {'name': payload,
+                                              'url': url_for('chart_image', result_id=cache_key, name=payload)})
+                elif event == 'result':
+                    payload['ingest'] = ingest
+                    if not payload['timed_out_charts']:
+                        result_cache.put(cache_key, payload)
+                    yield sse_event('done', {'result_id': cache_key, 'cached': False})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Server error: {str(e)}'})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Stop proxies from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def analysis_job(progress, data1, data2, cache_key, data_only):
+    """Background job body: returns the parts of the result needed by the status endpoint"""
+    result, error = run_analysis(data1, data2, cache_key, data_only, progress=progress)
+    if error:
+        raise ValueError(error)
+    return job_result(result)
+
+def chunked_analysis_job(progress, stream1, stream2, cache_key, data_only):
+    """Background job body for /api/upload/chunked; closes both streams when done"""
+    try:
+        stream1.seek(0)
+        stream2.seek(0)
+        result, error = collect_analysis(iter_chunked_analysis(stream1, stream2, cache_key,
+                                                               render_charts=not data_only), progress=progress)
+    finally:
+        stream1.close()
+        stream2.close()
+    if error:
+        raise ValueError(error)
+    if not result['timed_out_charts']:
+        result_cache.put(chunked_key(cache_key), result)
+    return job_result(result)
+
+def job_result(result):
+    return {
+        'model_id': result['model_id'],
+        'statistics': result['statistics'],
+        'model_metrics': result['model_metrics'],
+        'chart_data': result['chart_data'],
+        'charts': result['charts'],
+        'chart_key': result.get('chart_key'),
+        'dataset_id': result.get('dataset_id'),
+        'ingest': result.get('ingest'),
+        'sample_rows': result.get('sample_rows')
+    }
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue an analysis of two uploaded CSVs and return a job id to poll"""
+    try:
+        files, error = read_upload_pair()
+        if error:
+            return jsonify({'error': error}), 400
+        data1, data2 = files
+        
+        cache_key = content_key(data1, data2)
+        data_only = request.args.get('format') == 'data'
+        job_id = f"{cache_key}-{'data' if data_only else 'charts'}"
+        
+        try:
+            # Already-cached results complete immediately without taking a pool slot
+            result = get_cached_result(cache_key, data_only)
+            if result is not None:
+                status, deduplicated = job_manager.submit(job_id, lambda progress: job_result(result))
+            else:
+                status, deduplicated = job_manager.submit(job_id, analysis_job, data1, data2, cache_key, data_only)
+        except QueueFullError:
+            response = jsonify({'error': 'Too many analyses in progress, please retry shortly'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
         
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'deduplicated': deduplicated,
+            'status_url': url_for('job_status', job_id=job_id),
+            'state': status.get('state') if status else 'queued'
+        }), 202
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report a job's state and stage, and its results once done"""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    
+    response = {k: v for k, v in status.items() if k != 'result'}
+    if status.get('state') == 'done':
+        result_id, mode = job_id.rsplit('-', 1)
+        response['data'] = result_payload(result_id, status['result'], mode == 'data')
+    return jsonify({'success': True, 'job': response})
+
+@app.route('/api/charts/<result_id>/<name>.png', methods=['GET'])
+def chart_image(result_id, name):
+    """Serve a rendered chart with validators and long-lived caching"""
+    path = chart_store.path(result_id, name)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    
+    response = send_file(os.path.abspath(path), mimetype='image/png', etag=True,
+                         conditional=True, max_age=app.config['CHART_CACHE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report result cache occupancy and hit/miss counters"""
+    return jsonify({'success': True, 'cache': result_cache.stats()})
+
+def build_feature_frame(rows, meta, strict=True):
+    """Build a model input frame from row dicts, encoding names with the model's labels
+
+    Countries are looked up in the shared country dictionary unless the model
+    was trained with its own Country labels.
+
+    Unknown category values are an error when strict, otherwise they become NaN.
+    """
+    features = meta['features']
+    frame = pd.DataFrame(rows)
+    missing = [col for col in features if col not in frame.columns]
+    if missing:
+        return None, f'Missing features: {missing}'
+    frame = frame[features].copy()
+    
+    encodings = meta.get('encodings', {})
+    for col in frame.columns:
+        if pd.api.types.is_numeric_dtype(frame[col]):
+            continue
+        if col in encodings:
+            codes = pd.Categorical(frame[col], categories=encodings[col]).codes
+        elif col == 'Country':
+            codes = country_dictionary.encode(frame[col], add=False)
+        else:
+            continue
+        if strict and (codes < 0).any():
+            unknown = sorted(set(frame[col][codes < 0].astype(str)))
+            return None, f'Unknown {col} values: {unknown[:10]}'
+        frame[col] = np.where(codes < 0, np.nan, codes)
+    
+    try:
+        frame = frame.astype(float)
+    except (TypeError, ValueError) as e:
+        return None, f'Non-numeric feature values: {e}'
+    return frame, None
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     try:
-        data = request.json
-        # This would implement prediction logic using the trained model
-        # For now, return a placeholder response
+        data = request.get_json(silent=True) or {}
+        model_id = data.get('model_id')
+        rows = data.get('rows')
+        if not model_id or not isinstance(rows, list) or not rows:
+            return jsonify({'error': 'model_id and a non-empty list of rows are required'}), 400
+        
+        meta = model_registry.metadata(model_id)
+        if meta is None:
+            return jsonify({'error': f'Unknown model: {model_id}'}), 404
+        
+        # Rows may be feature dicts or plain lists in the model's feature order
+        if all(isinstance(row, list) for row in rows):
+            rows = [dict(zip(meta['features'], row)) for row in rows]
+        features, error = build_feature_frame(rows, meta)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Exported forests skip loading the sklearn model and its per-call overhead
+        forest = model_registry.load_compact(model_id) if len(features) <= COMPACT_PREDICT_MAX_ROWS else None
+        if forest is not None and (forest.handles_missing or not features.isna().any().any()):
+            predictions = forest.predict(features.to_numpy())
+        else:
+            model, _ = model_registry.load(model_id)
+            predictions = model.predict(features)
         return jsonify({
             'success': True,
-            'prediction': 'Prediction functionality to be implemented'
+            'model_id': model_id,
+            'predictions': [float(p) for p in predictions]
         })
     except Exception as e:
         return jsonify({'error': f'Prediction error: {str(e)}'}), 500
 
-@app.route('/api/debug', methods=['POST'])
-def debug_data():
-    """Debug endpoint to check data processing"""
+ARROW_MIMETYPES = {'application/vnd.apache.arrow.stream', 'application/vnd.apache.arrow.file'}
+
+def iter_input_chunks(stream, is_arrow, chunk_size):
+    """Yield DataFrame chunks of an uploaded CSV or Arrow IPC stream"""
+    if is_arrow:
+        reader = pa.ipc.open_stream(stream)
+        for batch in reader:
+            frame = batch.to_pandas()
+            for start in range(0, len(frame), chunk_size):
+                yield frame.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(stream, chunksize=chunk_size)
+
+def iter_dataset_chunks(df, chunk_size):
+    """Yield chunks of a stored dataset with encoded columns turned back into names"""
+    encodings = df.attrs.get('encodings', {})
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].copy()
+        for col, classes in encodings.items():
+            if col in chunk.columns:
+                chunk[col] = np.asarray(classes, dtype=object)[chunk[col].to_numpy(dtype=int)]
+        if 'Country' in chunk.columns and 'Country' not in encodings:
+            chunk['Country'] = country_dictionary.decode(chunk['Country'].to_numpy())
+        yield chunk
+
+def score_chunk(chunk, model, meta):
+    """Predict one chunk; rows with missing or unknown features get no prediction"""
+    chunk = chunk.rename(columns=COLUMN_MAPPING)
+    features, error = build_feature_frame(chunk, meta, strict=False)
+    if error:
+        return None, error
+    
+    valid = features.notna().all(axis=1).to_numpy()
+    predictions = np.full(len(features), np.nan)
+    if valid.any():
+        predictions[valid] = model.predict(features[valid])
+    
+    ids = [col for col in ('Country', 'Year') if col in chunk.columns]
+    output = chunk[ids].reset_index(drop=True)
+    output['prediction'] = predictions
+    return output, None
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score a large CSV/Arrow feature file in fixed-size chunks, streaming the results
+
+    The file can be sent as multipart field "file" or as the raw request body
+    (text/csv or an Arrow IPC stream), in which case scoring starts while the
+    body is still being received. ?dataset_id=... scores a stored dataset
+    instead. Output is CSV by default or NDJSON with ?output=ndjson.
+    """
+    try:
+        model_id = request.args.get('model_id') or request.form.get('model_id')
+        output_format = request.args.get('output', 'csv')
+        chunk_size, error = read_int_arg('chunk_size', 1, BATCH_MAX_CHUNK_SIZE)
+        if error:
+            return jsonify({'error': error}), 400
+        chunk_size = chunk_size or BATCH_CHUNK_SIZE
+        if output_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'output must be csv or ndjson'}), 400
+        
+        loaded = model_registry.load(model_id) if model_id else None
+        if loaded is None:
+            return jsonify({'error': f'Unknown model: {model_id}'}), 404
+        model, meta = loaded
+        
+        dataset_id = request.args.get('dataset_id') or request.form.get('dataset_id')
+        stream = None
+        if dataset_id:
+            dataset = dataset_store.load(dataset_id)
+            if dataset is None:
+                return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+            chunks = iter_dataset_chunks(dataset, chunk_size)
+        elif 'file' in request.files:
+            upload = request.files['file']
+            # Multipart uploads are closed with the request, so spool our own copy to disk
+            stream = tempfile.TemporaryFile(dir=UPLOAD_FOLDER)
+            shutil.copyfileobj(upload.stream, stream)
+            stream.seek(0)
+            is_arrow = upload.filename.lower().endswith(('.arrow', '.arrows')) or upload.mimetype in ARROW_MIMETYPES
+        else:
+            stream = request.stream
+            is_arrow = request.mimetype in ARROW_MIMETYPES
+        if stream is not None:
+            if is_arrow and pa is None:
+                return jsonify({'error': 'Arrow input requires pyarrow to be installed'}), 400
+            chunks = iter_input_chunks(stream, is_arrow, chunk_size)
+        
+        # Validate the schema on the first chunk before committing to a 200 response
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return jsonify({'error': 'No rows to score'}), 400
+        first_output, error = score_chunk(first_chunk, model, meta)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        def generate():
+            output, header, rows_scored = first_output, True, 0
+            while True:
+                if output_format == 'csv':
+                    yield output.to_csv(index=False, header=header)
+                else:
+                    yield output.to_json(orient='records', lines=True)
+                    yield '\n'
+                header = False
+                rows_scored += len(output)
+                
+                try:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        return
+                    output, error = score_chunk(chunk, model, meta)
+                except Exception as e:
+                    error = f'Could not read input: {str(e)}'
+                if error:
+                    # The 200 is already sent, so end with a record that marks the output as truncated
+                    app.logger.warning('Batch scoring stopped after %d rows: %s', rows_scored, error)
+                    if output_format == 'csv':
+                        yield f'# error: {error} (rows_scored={rows_scored})\n'
+                    else:
+                        yield json.dumps({'error': error, 'rows_scored': rows_scored}) + '\n'
+                    return
+        
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        if stream is not None and stream is not request.stream:
+            response.call_on_close(stream.close)
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Batch prediction error: {str(e)}'}), 500
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """List registered models with their feature schema and metrics"""
+    models = [{k: v for k, v in meta.items() if k != 'encodings'} for meta in model_registry.list_models()]
+    return jsonify({'success': True, 'models': models})
+
+def read_int_option(data, name, minimum, maximum):
+    """Return (value, error) for an optional integer option in a JSON body"""
+    value = data.get(name)
+    if value is None:
+        return None, None
+    if isinstance(value, bool) or not isinstance(value, int) or not minimum <= value <= maximum:
+        return None, f'{name} must be an integer between {minimum} and {maximum}'
+    return value, None
+
+def read_int_arg(name, minimum, maximum):
+    """Return (value, error) for an optional integer query string argument"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None, None
+    try:
+        value = int(value)
+    except ValueError:
+        value = None
+    if value is None or not minimum <= value <= maximum:
+        return None, f'{name} must be an integer between {minimum} and {maximum}'
+    return value, None
+
+@app.route('/api/models/train', methods=['POST'])
+def train_dataset_model():
+    """Train a model on a stored dataset, or grow a registered forest with warm start
+
+    JSON body: dataset_id, and optionally engine (random_forest,
+    hist_gradient_boosting, ridge or auto), time_budget in seconds for auto,
+    n_estimators (trees or boosting rounds to train, or trees to add when
+    base_model_id is given) and n_jobs (threads, -1 for all).
+    """
     try:
-        if 'file1' not in request.files or 'file2' not in request.files:
-            return jsonify({'error': 'Two CSV files are required'}), 400
+        data = request.get_json(silent=True) or {}
+        dataset_id = data.get('dataset_id')
+        if not dataset_id:
+            return jsonify({'error': 'dataset_id is required'}), 400
+        n_estimators, error = read_int_option(data, 'n_estimators', 1, 2000)
+        if not error:
+            n_jobs, error = read_int_option(data, 'n_jobs', -1, os.cpu_count() or 1)
+        if error or n_jobs == 0:
+            return jsonify({'error': error or 'n_jobs must not be 0'}), 400
+        engine = data.get('engine') or app.config['MODEL_ENGINE']
+        if engine not in ENGINES and engine != AUTO_ENGINE:
+            return jsonify({'error': f"engine must be one of {sorted(ENGINES) + [AUTO_ENGINE]}"}), 400
+        time_budget = data.get('time_budget')
+        if time_budget is not None and (isinstance(time_budget, bool) or not isinstance(time_budget, (int, float))
+                                        or not 0 < time_budget <= 600):
+            return jsonify({'error': 'time_budget must be a number of seconds between 0 and 600'}), 400
+        
+        df = dataset_store.load(dataset_id)
+        if df is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+        
+        base_model_id = data.get('base_model_id')
+        base_model = None
+        if base_model_id:
+            loaded = model_registry.load(base_model_id)
+            if loaded is None:
+                return jsonify({'error': f'Unknown model: {base_model_id}'}), 404
+            base_model, base_meta = loaded
+            features = [col for col in df.columns if col != 'mental_fitness']
+            if not isinstance(base_model, RandomForestRegressor) or base_meta['features'] != features:
+                return jsonify({'error': 'Only a random forest trained on the same features can be extended'}), 400
+            if 'Country' in base_meta.get('encodings', {}):
+                # Per-upload country labels would not line up with the shared dictionary
+                return jsonify({'error': 'Model uses per-upload country labels and cannot be extended'}), 400
+        
+        model_result, error = train_model(df, n_estimators, n_jobs, base_model, engine, time_budget)
+        if error:
+            return jsonify({'error': f'Model training error: {error}'}), 400
         
-        file1 = request.files['file1']
-        file2 = request.files['file2']
+        model = model_result['model']
+        model_metrics = {
+            'train': model_result['train_metrics'],
+            'test': model_result['test_metrics']
+        }
+        if base_model is not None:
+            config = {'engine': 'random_forest', 'n_estimators': len(model.estimators_),
+                      'base_model_id': base_model_id}
+        else:
+            config = {'engine': engine, 'n_estimators': n_estimators or app.config['MODEL_N_ESTIMATORS']}
+            if engine == AUTO_ENGINE:
+                # The budget decides which engines finish, so it is part of the model's identity
+                config['time_budget'] = time_budget or app.config['MODEL_TIME_BUDGET']
+        model_id = register_model(dataset_id, model, df, model_metrics, config,
+                                  extra=training_details(model_result))
+        if model_id is None:
+            return jsonify({'error': 'Model could not be stored'}), 500
         
-        # Read CSV files
-        df1 = pd.read_csv(file1)
-        df2 = pd.read_csv(file2)
+        return jsonify({
+            'success': True,
+            'model_id': model_id,
+            'dataset_id': dataset_id,
+            'base_model_id': base_model_id,
+            'engine': model_result['engine'],
+            'engines': model_result['engines'],
+            'n_estimators': len(model.estimators_) if base_model is not None else config['n_estimators'],
+            'train_seconds': model_result['train_seconds'],
+            'predict_us_per_row': model_result['predict_us_per_row'],
+            'model_metrics': model_metrics
+        })
+    except Exception as e:
+        return jsonify({'error': f'Training error: {str(e)}'}), 500
+
+@app.route('/api/models/evaluate', methods=['POST'])
+def evaluate_model():
+    """Grouped k-fold cross-validation of a model config on a stored dataset
+
+    JSON body: dataset_id, and optionally engine, n_estimators, n_splits,
+    group_by ('country' or 'year') and year_block (years per group when
+    grouping by year). Fold scores are cached, so repeats are free.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        dataset_id = data.get('dataset_id')
+        if not dataset_id:
+            return jsonify({'error': 'dataset_id is required'}), 400
+        engine = data.get('engine') or 'random_forest'
+        if engine not in ENGINES:
+            return jsonify({'error': f'engine must be one of {sorted(ENGINES)}'}), 400
+        group_by = data.get('group_by') or 'country'
+        if group_by not in GROUP_BY:
+            return jsonify({'error': f'group_by must be one of {list(GROUP_BY)}'}), 400
+        options = {}
+        for name, minimum, maximum, default in (('n_estimators', 1, 2000, app.config['MODEL_N_ESTIMATORS']),
+                                                ('n_splits', 2, 20, 5),
+                                                ('year_block', 1, 100, 5)):
+            value, error = read_int_option(data, name, minimum, maximum)
+            if error:
+                return jsonify({'error': error}), 400
+            options[name] = value or default
+        
+        df = dataset_store.load(dataset_id)
+        if df is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+        
+        config = dict(options, engine=engine, group_by=group_by)
+        if group_by == 'country':
+            # Year blocks don't apply, so they must not split the cache
+            config['year_block'] = None
+        start = time.perf_counter()
+        evaluation = cross_validator.evaluate(dataset_id, df, config)
+        evaluation['seconds'] = time.perf_counter() - start
+        return jsonify({'success': True, 'dataset_id': dataset_id, 'evaluation': evaluation})
+    except ValueError as e:
+        # e.g. fewer groups than folds
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Evaluation error: {str(e)}'}), 500
+
+def iter_tuning(dataset_id, engines, n_candidates=12, eta=3, time_budget=60, memory_budget_mb=None,
+                max_workers=1):
+    """Tune on a stored dataset, then refit and register the winner; yields progress events
+
+    Search events ('rung', 'candidate') are passed through, followed by
+    'stage' 'refit' and a final 'result' with the registered model (or 'error').
+    The refit runs in a capped worker process with whatever time is left.
+    """
+    deadline = time.monotonic() + time_budget
+    df = dataset_store.load(dataset_id)
+    if df is None:
+        yield 'error', f'Unknown dataset: {dataset_id}'
+        return
+    
+    split = split_dataset(df)
+    X_train, _, y_train, _ = split
+    outcome = None
+    for event, payload in successive_halving(X_train, y_train, engines, n_candidates, eta,
+                                             time_budget * (1 - TUNING_REFIT_SHARE), memory_budget_mb,
+                                             max_workers, n_estimators=app.config['MODEL_N_ESTIMATORS']):
+        if event == 'result':
+            outcome = payload
+        else:
+            yield event, payload
+    
+    best = outcome['best']
+    if best is None:
+        yield 'error', 'No candidate finished within the budget'
+        return
+    
+    yield 'stage', 'refit'
+    try:
+        result = refit_candidate(best, split, app.config['MODEL_N_ESTIMATORS'], deadline - time.monotonic(),
+                                 memory_budget_mb)
+    except MemoryError:
+        yield 'error', 'Model training error: memory budget exceeded'
+        return
+    except Exception as e:
+        yield 'error', f'Model training error: {str(e)}'
+        return
+    if result is None:
+        yield 'error', 'The refit of the best candidate did not finish within the time budget'
+        return
+    model_result = training_result(result, split)
+    
+    model_metrics = {
+        'train': model_result['train_metrics'],
+        'test': model_result['test_metrics']
+    }
+    config = {'engine': best['engine'], 'n_estimators': app.config['MODEL_N_ESTIMATORS'], 'params': best['params']}
+    tuning = {'best_candidate': best, 'timed_out': outcome['timed_out'], 'rung_sizes': outcome['rung_sizes'],
+              'search_seconds': outcome['seconds']}
+    model_id = register_model(dataset_id, model_result['model'], df, model_metrics, config,
+                              extra=dict(training_details(model_result), tuning=tuning))
+    if model_id is None:
+        yield 'error', 'Model could not be stored'
+        return
+    yield 'result', {'model_id': model_id, 'engine': best['engine'], 'params': best['params'],
+                     'model_metrics': model_metrics, 'tuning': tuning}
+
+@app.route('/api/models/tune', methods=['POST'])
+def tune_model():
+    """Successive-halving search on a stored dataset, streamed as Server-Sent Events
+
+    JSON body: dataset_id, and optionally engines (list), n_candidates, eta,
+    time_budget (seconds, including the final refit) and memory_budget_mb
+    (shared by the search workers). Emits 'rung', 'candidate', 'stage' and a
+    final 'done' with the registered model, or 'error'.
+    """
+    data = request.get_json(silent=True) or {}
+    dataset_id = data.get('dataset_id')
+    if not dataset_id or not dataset_store.exists(dataset_id):
+        return jsonify({'error': 'dataset_id of a stored dataset is required'}), 400
+    engines = data.get('engines') or list(SEARCH_SPACES)
+    if not isinstance(engines, list) or not engines or any(engine not in SEARCH_SPACES for engine in engines):
+        return jsonify({'error': f'engines must be a list drawn from {sorted(SEARCH_SPACES)}'}), 400
+    options = {}
+    for name, minimum, maximum, default in (('n_candidates', 1, 200, 12), ('eta', 2, 10, 3),
+                                            ('memory_budget_mb', 64, 64 * 1024, None)):
+        value, error = read_int_option(data, name, minimum, maximum)
+        if error:
+            return jsonify({'error': error}), 400
+        options[name] = value or default
+    time_budget = data.get('time_budget', 60)
+    if isinstance(time_budget, bool) or not isinstance(time_budget, (int, float)) \
+            or not 0 < time_budget <= app.config['TUNING_MAX_TIME_BUDGET']:
+        return jsonify({'error': f"time_budget must be between 0 and {app.config['TUNING_MAX_TIME_BUDGET']} seconds"}), 400
+    
+    def generate():
+        try:
+            for event, payload in iter_tuning(dataset_id, engines, options['n_candidates'], options['eta'],
+                                              time_budget, options['memory_budget_mb'],
+                                              app.config['TUNING_WORKERS']):
+                if event == 'error':
+                    yield sse_event('error', {'error': payload})
+                    return
+                if event == 'stage':
+                    yield sse_event('stage', {'stage': payload})
+                elif event == 'result':
+                    yield sse_event('done', payload)
+                else:
+                    yield sse_event(event, payload)
+        except Exception as e:
+            yield sse_event('error', {'error': f'Tuning error: {str(e)}'})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Stop proxies from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/models/<model_id>', methods=['GET'])
+def model_details(model_id):
+    meta = model_registry.metadata(model_id)
+    if meta is None:
+        return jsonify({'error': f'Unknown model: {model_id}'}), 404
+    return jsonify({'success': True, 'model': meta})
+
+@app.route('/api/models/<model_id>/importance', methods=['GET'])
+def model_importance(model_id):
+    """Permutation importances on the model's held-out rows, next to its built-in ones"""
+    try:
+        meta = model_registry.metadata(model_id)
+        if meta is None:
+            return jsonify({'error': f'Unknown model: {model_id}'}), 404
+        
+        permutation = importance_service.get(model_id)
+        cached = permutation is not None
+        if not cached:
+            df = dataset_store.load(meta['result_id'])
+            if df is None:
+                return jsonify({'error': f"Training dataset {meta['result_id']} is no longer stored"}), 404
+            model, _ = model_registry.load(model_id)
+            _, X_test, _, y_test = split_dataset(df)
+            permutation = importance_service.compute(model_id, model, X_test, y_test, X_test.columns)
+        
+        return jsonify({
+            'success': True,
+            'model_id': model_id,
+            'cached': cached,
+            'features': meta['features'],
+            'permutation': permutation,
+            'model_importances': meta.get('feature_importances')
+        })
+    except Exception as e:
+        return jsonify({'error': f'Importance error: {str(e)}'}), 500
+
+def dataset_aggregates(dataset_id):
+    """Return the stored aggregates of a dataset, computing them for older datasets"""
+    meta = dataset_store.metadata(dataset_id)
+    if meta is None:
+        return None
+    # Aggregates stored before the cube and moment accumulators existed are rebuilt from the rows
+    if 'moments' in meta.get('aggregates', {}):
+        return meta['aggregates']
+    df = dataset_store.load(dataset_id)
+    return compute_aggregates(df) if df is not None else None
+
+def country_names(meta, codes):
+    """Country names for the codes of a stored dataset"""
+    # Older datasets carry their own label list instead of dictionary codes
+    classes = meta.get('attrs', {}).get('encodings', {}).get('Country')
+    codes = np.asarray(codes, dtype=int)
+    return np.asarray(classes, dtype=object)[codes] if classes else country_dictionary.decode(codes)
+
+def country_codes(meta, names):
+    """Codes of the named countries in a stored dataset, and the names it does not know"""
+    classes = meta.get('attrs', {}).get('encodings', {}).get('Country')
+    if classes:
+        codes = pd.Categorical(names, categories=classes).codes
+    else:
+        codes = country_dictionary.encode(names, add=False)
+    codes = np.asarray(codes)
+    return codes[codes >= 0], [name for name, code in zip(names, codes) if code < 0]
+
+def dataset_summary(meta, aggregates):
+    """JSON-ready description of a stored dataset"""
+    return {
+        'dataset_id': meta['dataset_id'],
+        'parent_id': meta.get('parent_id'),
+        'rows': meta['rows'],
+        'columns': meta['columns'],
+        'created_at': meta['created_at'],
+        'statistics': aggregate_statistics(aggregates),
+        'chart_data': aggregate_chart_data(aggregates)
+    }
+
+@app.route('/api/datasets/<dataset_id>', methods=['GET'])
+def dataset_details(dataset_id):
+    """Row count, statistics and chart data of a stored dataset"""
+    meta = dataset_store.metadata(dataset_id)
+    aggregates = dataset_aggregates(dataset_id)
+    if meta is None or aggregates is None:
+        return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+    return jsonify({'success': True, 'dataset': dataset_summary(meta, aggregates)})
+
+@app.route('/api/datasets/<dataset_id>/groups', methods=['GET'])
+def dataset_groups(dataset_id):
+    """Per-year or per-country count, mean, std, min and max of every indicator
+
+    Read straight from the dataset's aggregate cube (?by=Year or ?by=Country),
+    so the cost depends on the number of groups, not rows.
+    """
+    dimension = request.args.get('by', 'Year')
+    if dimension not in CUBE_DIMENSIONS:
+        return jsonify({'error': f'by must be one of {list(CUBE_DIMENSIONS)}'}), 400
+    meta = dataset_store.metadata(dataset_id)
+    aggregates = dataset_aggregates(dataset_id)
+    if meta is None or aggregates is None:
+        return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+    
+    groups = aggregate_groups(aggregates, dimension)
+    if groups is None:
+        return jsonify({'error': f'Dataset has no {dimension} column'}), 400
+    if dimension == 'Country':
+        groups['keys'] = country_names(meta, groups['keys']).tolist()
+    return jsonify({'success': True, 'dataset_id': dataset_id, 'groups': groups})
+
+@app.route('/api/datasets/<dataset_id>/append', methods=['POST'])
+def append_dataset(dataset_id):
+    """Add new (Entity, Year) rows to a stored dataset
+
+    The two CSVs hold only the new rows, in the same formats as /api/upload.
+    They are processed on their own and stored as a new dataset that reuses
+    the existing one's files; its aggregates are the stored totals plus those
+    of the new rows.
+    """
+    try:
+        aggregates = dataset_aggregates(dataset_id)
+        if aggregates is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
         
-        # Process data
-        processed_df, error = process_mental_health_data(df1, df2)
+        files, error = read_upload_pair()
         if error:
-            return jsonify({'error': f'Data processing error: {error}'}), 400
+            return jsonify({'error': error}), 400
+        data1, data2 = files
+        
+        new_id = content_key(dataset_id.encode(), data1, data2)
+        meta = dataset_store.metadata(new_id)
+        if meta is None:
+            df1, _ = read_csv_payload(data1)
+            df2, _ = read_csv_payload(data2)
+            new_df, error = process_mental_health_data(df1, df2)
+            if error:
+                return jsonify({'error': f'Data processing error: {error}'}), 400
+            if list(new_df.columns) != aggregates['columns']:
+                return jsonify({'error': f"Expected columns {aggregates['columns']}, got {list(new_df.columns)}"}), 400
+            
+            # Only years after a country's latest stored year are new; revisions are skipped
+            is_new = new_rows_mask(aggregates, new_df)
+            skipped = int((~is_new).sum())
+            new_df = new_df[is_new].reset_index(drop=True)
+            if new_df.empty:
+                return jsonify({'error': 'No new rows to append', 'skipped_rows': skipped}), 400
+            
+            meta = dataset_store.append(dataset_id, new_id, new_df, extra={
+                'aggregates': update_aggregates(aggregates, new_df),
+                'skipped_rows': skipped
+            })
+        
+        data = dataset_summary(meta, meta['aggregates'])
+        data['appended_rows'] = meta['part_rows']
+        data['skipped_rows'] = meta['skipped_rows']
+        return jsonify({'success': True, 'dataset': data})
+    except Exception as e:
+        return jsonify({'error': f'Append error: {str(e)}'}), 500
+
+@app.route('/api/datasets/<dataset_id>/rows', methods=['GET'])
+def query_dataset(dataset_id):
+    """Rows of a stored dataset for some countries and/or a year range
+
+    ?country= may be repeated; year_from and year_to are inclusive;
+    ?columns=a,b projects the output; ?format=arrow returns an Arrow IPC
+    stream instead of JSON. Lookups are binary searches on the dataset's
+    sorted (country, year) index, so only the matching rows are read.
+    """
+    try:
+        meta = dataset_store.metadata(dataset_id)
+        if meta is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+        
+        output_format = request.args.get('format', 'json')
+        if output_format not in ('json', 'arrow'):
+            return jsonify({'error': 'format must be json or arrow'}), 400
+        if output_format == 'arrow' and pa is None:
+            return jsonify({'error': 'Arrow output requires pyarrow to be installed'}), 400
+        try:
+            year_from, year_to = (int(request.args[name]) if request.args.get(name) else None
+                                  for name in ('year_from', 'year_to'))
+            limit = int(request.args.get('limit', QUERY_MAX_ROWS))
+        except ValueError:
+            return jsonify({'error': 'year_from, year_to and limit must be integers'}), 400
+        if not 0 < limit <= QUERY_MAX_ROWS:
+            return jsonify({'error': f'limit must be between 1 and {QUERY_MAX_ROWS}'}), 400
+        
+        columns = request.args.get('columns')
+        columns = columns.split(',') if columns else meta['columns']
+        unknown = [col for col in columns if col not in meta['columns']]
+        if unknown:
+            return jsonify({'error': f"Unknown columns: {unknown}. Expected some of {meta['columns']}"}), 400
+        
+        countries = request.args.getlist('country') or None
+        if countries is not None:
+            countries, missing = country_codes(meta, countries)
+            if missing:
+                return jsonify({'error': f'Unknown countries: {missing}'}), 404
+        
+        # Columns are memory-mapped, so only the rows picked by the index are read
+        df = dataset_store.load(dataset_id)
+        index = index_store.get(dataset_id, lambda: df) if df is not None else None
+        if index is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+        
+        rows = index.lookup(countries, year_from, year_to)
+        total = len(rows)
+        rows = rows[:limit]
+        result = df[columns].take(rows).reset_index(drop=True)
+        if 'Country' in result.columns:
+            result['Country'] = country_names(meta, result['Country'].to_numpy())
+        
+        if output_format == 'arrow':
+            sink = io.BytesIO()
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            response = Response(sink.getvalue(), mimetype='application/vnd.apache.arrow.stream')
+            response.headers['X-Total-Rows'] = str(total)
+            return response
+        
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'columns': columns,
+            'total_rows': total,
+            'truncated': total > len(rows),
+            'rows': result.astype(object).where(result.notna(), None).to_dict('records')
+        })
+    except Exception as e:
+        return jsonify({'error': f'Query error: {str(e)}'}), 500
+
+@app.route('/api/datasets/<dataset_id>/trends', methods=['GET'])
+def dataset_trends(dataset_id):
+    """Per-country trend lines and forecasts of a stored dataset
+
+    Every (indicator, country) series is fitted at once on first request and
+    cached. With ?country= the response has that country's trend for each
+    indicator (or just ?indicator=), forecast ?horizon= years past its last
+    year; without it, the slope of every country for one indicator.
+    """
+    try:
+        horizon, error = read_int_arg('horizon', 0, TREND_MAX_HORIZON)
+        if not error:
+            degree, error = read_int_arg('degree', 1, 2)
+        if error:
+            return jsonify({'error': error}), 400
+        horizon = horizon or 0
+        degree = degree or 1
+        
+        meta = dataset_store.metadata(dataset_id)
+        fit = trend_store.get(dataset_id, degree, lambda: dataset_store.load(dataset_id)) if meta else None
+        if fit is None:
+            return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+        
+        indicator = request.args.get('indicator')
+        if indicator is not None and indicator not in fit['indicators']:
+            return jsonify({'error': f"Unknown indicator: {indicator}. Expected one of {fit['indicators']}"}), 400
+        
+        names = country_names(meta, fit['countries'])
+        
+        country = request.args.get('country')
+        if country is None:
+            indicator = indicator or 'mental_fitness'
+            i = fit['indicators'].index(indicator)
+            slopes = fit['coef'][i, :, 1]
+            order = np.argsort(-np.nan_to_num(slopes, nan=-np.inf))
+            return jsonify({
+                'success': True,
+                'dataset_id': dataset_id,
+                'indicator': indicator,
+                'degree': degree,
+                'countries': [{'country': names[c], 'slope_per_year': float(slopes[c]),
+                               'r2': None if np.isnan(fit['r2'][i, c]) else float(fit['r2'][i, c])}
+                              for c in order if not np.isnan(slopes[c])]
+            })
+        
+        matches = np.flatnonzero(names == country)
+        if len(matches) == 0:
+            return jsonify({'error': f'Unknown country: {country}'}), 404
+        position = matches[0]
+        indicators = [indicator] if indicator else fit['indicators']
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'country': country,
+            'degree': degree,
+            'horizon': horizon,
+            'trends': {name: series_trend(fit, name, position, horizon) for name in indicators}
+        })
+    except Exception as e:
+        return jsonify({'error': f'Trend error: {str(e)}'}), 500
+
+@app.route('/api/debug', methods=['POST'])
+def debug_data():
+    """Debug endpoint to check data processing"""
+    try:
+        # A stored dataset can be inspected without re-uploading the CSVs
+        dataset_id = request.args.get('dataset_id') or request.form.get('dataset_id')
+        if dataset_id:
+            processed_df = dataset_store.load(dataset_id)
+            if processed_df is None:
+                return jsonify({'error': f'Unknown dataset: {dataset_id}'}), 404
+            debug_info = {'dataset': dataset_store.metadata(dataset_id)}
+        else:
+            if 'file1' not in request.files or 'file2' not in request.files:
+                return jsonify({'error': 'Two CSV files are required'}), 400
+            
+            file1 = request.files['file1']
+            file2 = request.files['file2']
+            
+            # Read CSV files
+            df1, ingest1 = read_csv_payload(file1.read())
+            df2, ingest2 = read_csv_payload(file2.read())
+            
+            # Process data
+            processed_df, error = process_mental_health_data(df1, df2)
+            if error:
+                return jsonify({'error': f'Data processing error: {error}'}), 400
+            
+            debug_info = {
+                'ingest': [ingest1, ingest2],
+                'original_df1_shape': df1.shape,
+                'original_df2_shape': df2.shape
+            }
         
         # Return debug information
-        debug_info = {
-            'original_df1_shape': df1.shape,
-            'original_df2_shape': df2.shape,
+        debug_info.update({
             'processed_df_shape': processed_df.shape,
             'processed_df_columns': list(processed_df.columns),
             'processed_df_dtypes': {col: str(dtype) for col, dtype in processed_df.dtypes.items()},
@@ -479,7 +1984,7 @@ def debug_data():
                 'sample_values': processed_df['Year'].head().tolist() if 'Year' in processed_df.columns else []
             },
             'sample_data': processed_df.head().to_dict('records')
-        }
+        })
         
         return jsonify({'success': True, 'debug_info': debug_info})
         
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark CompactForest prediction against RandomForestRegressor.predict.
+
+Trains a forest on the bundled OWID CSVs, exports it, checks that both give
+the same predictions and times batches of increasing size:
+
+    python benchmarks/forest_benchmark.py --trees 100
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compact_forest import CompactForest  # noqa: E402
+from ingest import COLUMN_MAPPING, read_csv_payload  # noqa: E402
+from joins import merge_datasets  # noqa: E402
+
+PREVALENCE_CSV = os.path.join(ROOT, 'prevalence-by-mental-and-substance-use-disorder.csv')
+SHARE_CSV = os.path.join(ROOT, 'mental-and-substance-use-as-share-of-disease.csv')
+
+
+def load_features():
+    """The processed feature matrix and target, as train_model sees them"""
+    with open(PREVALENCE_CSV, 'rb') as f:
+        df1, _ = read_csv_payload(f.read())
+    with open(SHARE_CSV, 'rb') as f:
+        df2, _ = read_csv_payload(f.read())
+    df = merge_datasets(df1, df2).rename(columns=COLUMN_MAPPING)
+    df['Country'] = df['Country'].astype('category').cat.codes
+    return df.drop(columns='mental_fitness'), df['mental_fitness']
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    X, y = load_features()
+    model = RandomForestRegressor(n_estimators=args.trees, random_state=0).fit(X, y)
+    forest = CompactForest.from_sklearn(model)
+
+    print(f'{args.trees} trees, {len(forest.value):,} nodes')
+    print(f'  pickled RandomForestRegressor: {len(pickle.dumps(model)) / 1e6:8.1f} MB')
+    print(f'  CompactForest arrays:          {forest.nbytes / 1e6:8.1f} MB')
+
+    X_all = X.to_numpy()
+    for rows in (1, 10, 100, 1000, len(X_all)):
+        frame, array = X.iloc[:rows], X_all[:rows]
+        sklearn_time, expected = best_of(lambda: model.predict(frame), args.repeat)
+        compact_time, predicted = best_of(lambda: forest.predict(array), args.repeat)
+        error = np.abs(predicted - expected).max()
+
+        print(f'{rows:,} rows (max abs difference {error:.2e})')
+        print(f'  RandomForestRegressor.predict: {sklearn_time * 1000:8.2f} ms')
+        print(f'  CompactForest.predict:         {compact_time * 1000:8.2f} ms  '
+              f'({sklearn_time / compact_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark merge_datasets against the original pandas merge.
+
+Scales the bundled OWID CSVs up by giving each copy its own set of entity
+names, then times the preprocessing join both ways, with object keys and
+with the categorical keys ingest produces:
+
+    python benchmarks/merge_benchmark.py --scale 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import read_csv_payload  # noqa: E402
+from joins import merge_datasets, _merge_with_pandas  # noqa: E402
+
+PREVALENCE_CSV = os.path.join(ROOT, 'prevalence-by-mental-and-substance-use-disorder.csv')
+SHARE_CSV = os.path.join(ROOT, 'mental-and-substance-use-as-share-of-disease.csv')
+
+
+def scale_up(df, scale):
+    """Concatenate `scale` copies of df with distinct entity names"""
+    copies = []
+    for k in range(scale):
+        copy = df.copy()
+        copy['Entity'] = copy['Entity'].astype(str) + f' #{k}'
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(PREVALENCE_CSV, 'rb') as f:
+        df1, _ = read_csv_payload(f.read())
+    with open(SHARE_CSV, 'rb') as f:
+        df2, _ = read_csv_payload(f.read())
+
+    for label, dtype, shuffle in (('object keys, sorted', object, False),
+                                  ('object keys, shuffled', object, True),
+                                  ('categorical keys, sorted', 'category', False),
+                                  ('categorical keys, shuffled', 'category', True)):
+        # Sorted by (Entity, Year) like real exports, so categorical codes are in order too
+        big1 = scale_up(df1, args.scale).astype({'Entity': dtype, 'Code': dtype})
+        big2 = scale_up(df2, args.scale).astype({'Entity': dtype, 'Code': dtype})
+        big1, big2 = (big.sort_values(['Entity', 'Year'], ignore_index=True) for big in (big1, big2))
+        if shuffle:
+            # Exports are normally sorted; shuffling forces the sort path of the join
+            big2 = big2.sample(frac=1, random_state=0)
+
+        pandas_time, expected = best_of(lambda: _merge_with_pandas(big1, big2), args.repeat)
+        packed_time, merged = best_of(lambda: merge_datasets(big1, big2), args.repeat)
+        pd.testing.assert_frame_equal(merged.astype({'Entity': object}),
+                                      expected.reset_index(drop=True).astype({'Entity': object}))
+
+        print(f'{label}: {len(big1):,} x {len(big2):,} rows -> {len(merged):,}')
+        print(f'  pd.merge + dropna + drop: {pandas_time * 1000:8.1f} ms')
+        print(f'  merge_datasets:           {packed_time * 1000:8.1f} ms  ({pandas_time / packed_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
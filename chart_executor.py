@@ -0,0 +1,129 @@
+"""
+Process-based executor for rendering charts concurrently.
+
+matplotlib's pyplot keeps global figure state and is not thread-safe, so
+each chart is rendered in a separate worker process rather than a thread.
+Workers still rendering when their pool is reset are terminated, so a
+timeout bounds the work done as well as the wait.
+"""
+
+import concurrent.futures
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ChartExecutor:
+    """Render independent chart functions in a bounded process pool"""
+
+    def __init__(self, max_workers=4, timeout=60):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def render(self, tasks):
+        """
+        Run {name: (func, args)} tasks and return ({name: result}, timed_out).
+
+        A chart that fails, or does not finish within `timeout` seconds of
+        submission, maps to None so the remaining charts are still returned;
+        the names of charts that timed out are listed in `timed_out`, as are
+        charts lost when the shared pool broke or was reset by another render.
+        """
+        results = {}
+        timed_out = []
+        for name, result, expired in self.render_iter(tasks):
+            results[name] = result
+            if expired:
+                timed_out.append(name)
+        return {name: results.get(name) for name in tasks}, timed_out
+
+    def render_iter(self, tasks):
+        """Yield (name, result, timed_out) for each task as soon as it finishes"""
+        if self.max_workers <= 1:
+            yield from self._render_serial(tasks)
+            return
+
+        # A pool broken or shut down by another render is replaced once; rendering
+        # serially here could race pyplot with other threads
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                futures = {pool.submit(func, *args): name for name, (func, args) in tasks.items()}
+                break
+            except (BrokenProcessPool, RuntimeError) as e:
+                print(f"Chart pool unavailable: {e}")
+                self._reset_pool(pool=pool)
+        else:
+            for name in tasks:
+                yield name, None, True
+            return
+
+        pending = set(futures)
+        broken = False
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=self.timeout):
+                pending.discard(future)
+                name = futures[future]
+                try:
+                    yield name, future.result(), False
+                except BrokenProcessPool as e:
+                    print(f"Chart '{name}' failed, worker pool broke: {e}")
+                    broken = True
+                    yield name, None, True
+                except concurrent.futures.CancelledError:
+                    # Another render reset the shared pool; report it like a timeout so the result is not cached
+                    print(f"Chart '{name}' was cancelled by a pool reset")
+                    yield name, None, True
+                except Exception as e:
+                    print(f"Chart '{name}' failed: {e}")
+                    yield name, None, False
+        except concurrent.futures.TimeoutError:
+            for future in pending:
+                print(f"Chart '{futures[future]}' timed out after {self.timeout}s")
+                future.cancel()
+                yield futures[future], None, True
+
+        # A stuck worker would keep its pool slot busy; start over with a fresh pool
+        if pending or broken:
+            self._reset_pool(pool=pool)
+
+    def shutdown(self):
+        self._reset_pool(wait=True)
+
+    def _render_serial(self, tasks):
+        for name, (func, args) in tasks.items():
+            try:
+                yield name, func(*args), False
+            except Exception as e:
+                print(f"Chart '{name}' failed: {e}")
+                yield name, None, False
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _reset_pool(self, wait=False, pool=None):
+        # With a pool given, only that pool is reset: another render may already have replaced it
+        with self._lock:
+            if pool is None or pool is self._pool:
+                pool, self._pool = self._pool, None
+            else:
+                pool = None
+        if pool is None:
+            return
+        if wait:
+            pool.shutdown(wait=True, cancel_futures=True)
+            return
+        # shutdown() lets running renders finish; stop their workers so a timed-out
+        # chart gives back its CPU and memory now rather than whenever it completes
+        if hasattr(pool, 'terminate_workers'):  # Python 3.14+
+            pool.terminate_workers()
+            return
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,71 @@
+"""
+On-disk store for rendered chart images.
+
+Charts are written once per analysis result and served as static PNG
+resources, so every gunicorn worker can answer for any result id and
+browsers can cache them.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class ChartStore:
+    """Stores PNG bytes under <root>/<result_id>/<name>.png"""
+
+    def __init__(self, root, max_results=200):
+        self.root = root
+        self.max_results = max_results
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, result_id, name):
+        """Return the file path for a chart, or None for unsafe identifiers"""
+        if not (_SAFE_NAME.match(result_id or '') and _SAFE_NAME.match(name or '')):
+            return None
+        return os.path.join(self.root, result_id, f'{name}.png')
+
+    def save(self, result_id, charts):
+        """Write {name: png_bytes} for a result and prune old results"""
+        directory = os.path.join(self.root, result_id)
+        os.makedirs(directory, exist_ok=True)
+        for name, png in charts.items():
+            target = self.path(result_id, name)
+            if target is None:
+                continue
+            # Write to a temp file first so readers never see a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, target)
+        self._prune()
+
+    def load(self, result_id, name):
+        """Return PNG bytes for a chart, or None if it is not stored"""
+        target = self.path(result_id, name)
+        if target is None or not os.path.exists(target):
+            return None
+        with open(target, 'rb') as f:
+            return f.read()
+
+    def has_all(self, result_id, names):
+        for name in names:
+            target = self.path(result_id, name)
+            if target is None or not os.path.exists(target):
+                return False
+        return True
+
+    def _prune(self):
+        """Drop the least recently written results beyond max_results"""
+        try:
+            entries = [e for e in os.scandir(self.root) if e.is_dir()]
+        except OSError:
+            return
+        if len(entries) <= self.max_results:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_results]:
+            shutil.rmtree(entry.path, ignore_errors=True)
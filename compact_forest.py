@@ -0,0 +1,137 @@
+"""
+Array-backed random forest for low-latency prediction.
+
+A fitted RandomForestRegressor is flattened into a handful of contiguous
+arrays (split feature, threshold, left/right child, the side missing values
+take and leaf value for every node of every tree) that are saved as .npy files and memory-mapped on load,
+so all gunicorn workers share one copy through the page cache. Prediction
+walks every tree for the whole batch at once with NumPy instead of calling
+into each tree separately.
+"""
+
+import os
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+# Exports written before missing values were routed lack this array
+OPTIONAL_ARRAYS = ('missing_left',)
+LEAF = -1
+
+
+class CompactForest:
+    """A regression forest stored as flat float32/int32 node arrays"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, n_features, missing_left=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.n_features = n_features
+        self.missing_left = missing_left
+
+    @property
+    def handles_missing(self):
+        """Whether NaN features are sent down the same side sklearn sends them"""
+        return self.missing_left is not None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted single-output RandomForestRegressor"""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be exported')
+
+        features, thresholds, lefts, rights, values, roots, missing_lefts = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == LEAF
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(_float32_floor(tree.threshold))
+            # Child indices are made global so all trees share one node table
+            lefts.append(np.where(is_leaf, LEAF, tree.children_left + offset))
+            rights.append(np.where(is_leaf, LEAF, tree.children_right + offset))
+            values.append(tree.value[:, 0, 0])
+            missing_lefts.append(tree.missing_go_to_left)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float32),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int32),
+            n_features=int(model.n_features_in_),
+            missing_left=np.concatenate(missing_lefts).astype(bool)
+        )
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ARRAYS}
+        for name in OPTIONAL_ARRAYS:
+            path = os.path.join(directory, f'{name}.npy')
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode=mmap_mode)
+        n_features = int(np.load(os.path.join(directory, 'n_features.npy')))
+        return cls(n_features=n_features, **arrays)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS + OPTIONAL_ARRAYS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name), allow_pickle=False)
+        np.save(os.path.join(directory, 'n_features.npy'), np.int32(self.n_features))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS + OPTIONAL_ARRAYS if getattr(self, name) is not None)
+
+    def predict(self, X):
+        """Mean of the trees' leaf values for each row of X
+
+        NaN features go down the side sklearn's tree_.missing_go_to_left
+        picks; exports without that array reject NaN with ValueError.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)  # sklearn also compares in float32
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got shape {X.shape}')
+        n_rows, n_trees = len(X), len(self.roots)
+        flat = X.ravel()
+        missing = np.isnan(flat)
+        if not missing.any():
+            missing = None
+        elif not self.handles_missing:
+            raise ValueError('This forest was exported without missing-value routing')
+
+        # One cursor per (tree, row) pair: its current node and the row's offset
+        # into flat. Pairs that reach a leaf are dropped after every level.
+        node = np.repeat(self.roots, n_rows)
+        base = np.tile(np.arange(n_rows, dtype=np.int32) * self.n_features, n_trees)
+        totals = np.zeros(n_rows)
+        while len(node):
+            left = self.left.take(node)
+            done = left == LEAF
+            if done.any():
+                totals += np.bincount(base[done] // self.n_features, weights=self.value.take(node[done]),
+                                      minlength=n_rows)
+                keep = ~done
+                node, base, left = node[keep], base[keep], left[keep]
+            position = base + self.feature.take(node)
+            goes_left = flat.take(position) <= self.threshold.take(node)
+            if missing is not None:
+                goes_left |= missing.take(position) & self.missing_left.take(node)
+            node = np.where(goes_left, left, self.right.take(node))
+        return totals / n_trees
+
+
+def _float32_floor(threshold):
+    """Largest float32 <= each threshold, so x <= t32 exactly when x <= t for float32 x"""
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
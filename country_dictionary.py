@@ -0,0 +1,118 @@
+"""
+Persistent, append-only dictionary of country names.
+
+Every country ever seen gets the next integer code, and codes are never
+reused or reassigned, so the same country encodes to the same value in
+every upload, stored dataset and model. The dictionary is a file of one
+JSON string per line (the line number is the code); each worker maps it
+into memory once and only reads the lines appended since its last look.
+"""
+
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class CountryDictionary:
+    """Maps country names to stable integer codes backed by an append-only file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._codes = {}
+        self._names = []
+        self._offset = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    def __len__(self):
+        return len(self._names)
+
+    def encode(self, values, add=True):
+        """Return int32 codes for values, appending unseen names when add is True
+
+        Missing values, and unseen names when add is False, are coded -1.
+        """
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        uniques = [str(name) for name in uniques]
+
+        missing = [name for name in uniques if name not in self._codes]
+        if missing:
+            with self._lock:
+                # Another worker may have added them since we last looked
+                self._refresh()
+                missing = [name for name in uniques if name not in self._codes]
+                if missing and add:
+                    self._append(missing)
+
+        lookup = np.array([self._codes.get(name, -1) for name in uniques] + [-1], dtype=np.int32)
+        return lookup[codes]  # missing values have code -1, which picks the last slot
+
+    def decode(self, codes):
+        """Return the names for codes as an object array; unknown codes become None"""
+        codes = np.asarray(codes)
+        if len(self._names) <= (codes.max() if codes.size else -1):
+            with self._lock:
+                self._refresh()
+        names = np.array(self._names + [None], dtype=object)
+        codes = np.where((codes >= 0) & (codes < len(self._names)), codes, len(self._names))
+        return names[codes.astype(np.intp)]
+
+    def names(self):
+        return list(self._names)
+
+    def _refresh(self):
+        # Read only the lines appended after self._offset
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size <= self._offset:
+                    return
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                    end = data.rfind(b'\n', self._offset, size) + 1
+                    if end <= self._offset:
+                        return  # only a partially written line so far
+                    for line in data[self._offset:end].splitlines():
+                        self._add(json.loads(line))
+                    self._offset = end
+        except FileNotFoundError:
+            pass
+
+    def _append(self, names):
+        with open(self.path, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Pick up lines other processes appended while we waited for the lock
+                self._refresh()
+                new = [name for name in names if name not in self._codes]
+                if new:
+                    f.write(b''.join(json.dumps(name).encode() + b'\n' for name in new))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _add(self, name):
+        if name not in self._codes:
+            self._codes[name] = len(self._names)
+        # Keep line number == code even if a name was somehow written twice
+        self._names.append(name)
@@ -0,0 +1,118 @@
+"""
+Grouped k-fold cross-validation with per-fold result caching.
+
+Rows of the same country (or the same block of years) always land in the
+same fold, so a model is never scored on a country-year whose neighbours it
+was trained on. Folds are fitted in separate processes, and each fold's
+metrics are stored on disk under the dataset id and model config, so
+repeating an evaluation only fits the folds that are not cached yet.
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import GroupKFold
+
+from model_engines import build_model, evaluate
+from result_cache import content_key
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+GROUP_BY = ('country', 'year')
+
+
+def make_groups(df, group_by='country', year_block=5):
+    """Return the group label of every row: its country, or its block of years"""
+    if group_by == 'country':
+        return df['Country'].to_numpy()
+    if group_by == 'year':
+        return df['Year'].to_numpy() // year_block
+    raise ValueError(f'group_by must be one of {GROUP_BY}')
+
+
+def fit_fold(engine, n_estimators, X, y, train_idx, test_idx):
+    """Fit and score one fold; runs in a worker process"""
+    # One thread per fold: the folds themselves are the parallelism
+    model = build_model(engine, n_estimators, n_jobs=1)
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - start
+    return {
+        'train_rows': len(train_idx),
+        'test_rows': len(test_idx),
+        'fit_seconds': fit_seconds,
+        'test_metrics': evaluate(y[test_idx], model.predict(X[test_idx]))
+    }
+
+
+class CrossValidator:
+    """Runs grouped k-fold evaluations and caches each fold's result under root"""
+
+    def __init__(self, root, max_workers=1):
+        self.root = root
+        self.max_workers = max_workers
+        os.makedirs(root, exist_ok=True)
+
+    def evaluate(self, dataset_id, df, config, target='mental_fitness'):
+        """Cross-validate config on df, returning the fold results and their summary
+
+        config holds engine, n_estimators, n_splits, group_by and year_block.
+        """
+        key = content_key(dataset_id.encode(), json.dumps(config, sort_keys=True).encode())
+        X = df.drop(columns=target).to_numpy(dtype=np.float64)
+        y = df[target].to_numpy(dtype=np.float64)
+        groups = make_groups(df, config['group_by'], config['year_block'])
+        splits = list(GroupKFold(n_splits=config['n_splits']).split(X, y, groups))
+
+        folds = [self._load(key, i) for i in range(len(splits))]
+        missing = [i for i, fold in enumerate(folds) if fold is None]
+        args = [(config['engine'], config['n_estimators'], X, y, *splits[i]) for i in missing]
+
+        if len(missing) > 1 and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                fitted = list(pool.map(fit_fold, *zip(*args)))
+        else:
+            fitted = [fit_fold(*fold_args) for fold_args in args]
+
+        for i, fold in zip(missing, fitted):
+            self._save(key, i, fold)
+            folds[i] = fold
+
+        return {
+            'evaluation_id': key,
+            'config': config,
+            'cached_folds': len(splits) - len(missing),
+            'folds': folds,
+            'summary': self._summarize(folds)
+        }
+
+    @staticmethod
+    def _summarize(folds):
+        summary = {}
+        for metric in ('mse', 'rmse', 'r2'):
+            values = np.array([fold['test_metrics'][metric] for fold in folds], dtype=float)
+            summary[metric] = {'mean': float(values.mean()), 'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0}
+        summary['fit_seconds'] = float(sum(fold['fit_seconds'] for fold in folds))
+        return summary
+
+    def _path(self, key, fold):
+        if not _SAFE_ID.match(key or ''):
+            return None
+        return os.path.join(self.root, f'{key}-fold{fold}.json')
+
+    def _load(self, key, fold):
+        try:
+            with open(self._path(key, fold)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key, fold, result):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self._path(key, fold))
@@ -0,0 +1,136 @@
+"""
+Sorted (country, year) indexes over stored datasets.
+
+Each index holds two row orders of a dataset: by (country, year), with the
+pair packed into one int64 key, and by (year, country). A country lookup,
+with or without a year range, is then a pair of binary searches on the packed
+keys, and a year range over all countries a pair on the sorted years; only
+the matching rows are ever read from the memory-mapped dataset. Indexes
+are built once per dataset and kept as .npy files that load memory-mapped.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+ARRAYS = ('by_country', 'country_keys', 'by_year', 'years')
+# Years are stored offset into the low 32 bits of a key, so negative years sort correctly
+YEAR_OFFSET = 2 ** 31
+YEAR_MIN, YEAR_MAX = -YEAR_OFFSET, YEAR_OFFSET - 1
+
+
+def pack_keys(countries, years):
+    """Pack country codes and years into int64 keys ordered by (country, year)"""
+    countries = np.asarray(countries, dtype=np.int64)
+    years = np.asarray(years, dtype=np.int64)
+    return (countries << 32) | (years + YEAR_OFFSET)
+
+
+class DatasetIndex:
+    """Row orders of one dataset by (country, year) and by (year, country)"""
+
+    def __init__(self, by_country, country_keys, by_year, years):
+        self.by_country = by_country
+        self.country_keys = country_keys
+        self.by_year = by_year
+        self.years = years
+
+    @classmethod
+    def build(cls, df):
+        countries = df['Country'].to_numpy(dtype=np.int64)
+        years = df['Year'].to_numpy(dtype=np.int64)
+        by_country = np.lexsort((years, countries)).astype(np.int64)
+        by_year = np.lexsort((countries, years)).astype(np.int64)
+        return cls(by_country, pack_keys(countries, years)[by_country], by_year, years[by_year])
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ARRAYS))
+
+    def save(self, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name), allow_pickle=False)
+
+    def lookup(self, countries=None, year_from=None, year_to=None):
+        """Return the positions of the matching rows
+
+        Rows come in (country, year) order, or (year, country) order for a
+        year range over every country. countries is a list of country codes
+        (None for every country); the year bounds are inclusive and optional.
+        """
+        year_from = YEAR_MIN if year_from is None else year_from
+        year_to = YEAR_MAX if year_to is None else year_to
+        if year_from > year_to:
+            return np.empty(0, dtype=np.int64)
+
+        if countries is None:
+            if year_from == YEAR_MIN and year_to == YEAR_MAX:
+                return np.asarray(self.by_country)
+            lo = np.searchsorted(self.years, year_from, side='left')
+            hi = np.searchsorted(self.years, year_to, side='right')
+            return np.asarray(self.by_year[lo:hi])
+
+        codes = np.unique(np.asarray(countries, dtype=np.int64))
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        lo = np.searchsorted(self.country_keys, pack_keys(codes, year_from), side='left')
+        hi = np.searchsorted(self.country_keys, pack_keys(codes, year_to), side='right')
+        return np.concatenate([self.by_country[start:stop] for start, stop in zip(lo, hi)])
+
+
+class IndexStore:
+    """Builds dataset indexes on first use and keeps them under <root>/<dataset_id>/"""
+
+    def __init__(self, root, max_loaded=16):
+        self.root = root
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, dataset_id, load_df):
+        """Return the index of a dataset, building it from load_df() on a miss (None if no data)"""
+        with self._lock:
+            if dataset_id in self._loaded:
+                self._loaded.move_to_end(dataset_id)
+                return self._loaded[dataset_id]
+
+        directory = self._directory(dataset_id)
+        if directory is None:
+            return None
+        if not os.path.isdir(directory):
+            df = load_df()
+            if df is None:
+                return None
+            self._write(directory, DatasetIndex.build(df))
+        index = DatasetIndex.load(directory)
+
+        with self._lock:
+            self._loaded[dataset_id] = index
+            self._loaded.move_to_end(dataset_id)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+    def _directory(self, dataset_id):
+        if not _SAFE_ID.match(dataset_id or ''):
+            return None
+        return os.path.join(self.root, dataset_id)
+
+    def _write(self, directory, index):
+        # Written to a scratch directory and renamed into place in one step
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            index.save(tmp_dir)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Another worker built the same index first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
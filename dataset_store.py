@@ -0,0 +1,282 @@
+"""
+Columnar on-disk store for processed datasets.
+
+The merged, cleaned and encoded frame produced by process_mental_health_data
+is written once under a dataset id and loaded back memory-mapped, so later
+requests skip CSV parsing and the merge entirely. Datasets are stored as an
+uncompressed Arrow IPC file when pyarrow is installed, and otherwise as one
+.npy file per column; both load without copying the column data. A
+dataset created by appending rows stores only those rows and lists the
+parts it is made of; the first load copies the parts into one compacted
+file next to them, so later loads are memory-mapped too. Datasets larger than memory are written chunk by
+chunk through a DatasetWriter.
+"""
+
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+META_FILE = 'meta.json'
+ARROW_FILE = 'data.arrow'
+# Subdirectory holding all rows of an appended dataset in one part
+COMPACT_DIR = 'compact'
+# .npy headers are written at a fixed size so the row count can be filled in last
+NPY_HEADER_BYTES = 128
+
+
+class DatasetStore:
+    """Stores processed DataFrames under <root>/<dataset_id>/"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, dataset_id, df, extra=None):
+        """Write df under dataset_id unless it is already stored; returns its metadata"""
+        return self._write(dataset_id, df, {}, extra)
+
+    def append(self, parent_id, dataset_id, df, extra=None):
+        """Store parent_id plus the rows of df as a new dataset, writing only df
+
+        The new dataset refers to the parent's column files instead of copying
+        them, so the cost of an append is proportional to the appended rows.
+        """
+        parent = self.metadata(parent_id)
+        if parent is None:
+            raise ValueError(f'Unknown dataset: {parent_id}')
+        if list(df.columns) != parent['columns']:
+            raise ValueError(f"Expected columns {parent['columns']}, got {list(df.columns)}")
+        return self._write(dataset_id, df, {
+            'parent_id': parent_id,
+            'parts': parent.get('parts', [parent_id]) + [dataset_id],
+            'part_rows': len(df),
+            'rows': parent['rows'] + len(df)
+        }, extra)
+
+    def load(self, dataset_id):
+        """Return the stored frame backed by memory-mapped, read-only columns, or None"""
+        meta = self.metadata(dataset_id)
+        if meta is None:
+            return None
+
+        parts = meta.get('parts', [dataset_id])
+        df = self._load_part(dataset_id) if len(parts) == 1 else self._load_compacted(dataset_id, parts)
+        if df is None:
+            return None
+
+        df.attrs.update(meta.get('attrs', {}))
+        return df
+
+    def metadata(self, dataset_id):
+        directory = self._directory(dataset_id)
+        if directory is None:
+            return None
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update_metadata(self, dataset_id, extra):
+        """Replace metadata fields of a stored dataset; returns the new metadata"""
+        meta = self.metadata(dataset_id)
+        if meta is None:
+            raise ValueError(f'Unknown dataset: {dataset_id}')
+        meta.update(extra)
+        directory = self._directory(dataset_id)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+        return meta
+
+    def exists(self, dataset_id):
+        return self.metadata(dataset_id) is not None
+
+    def _directory(self, dataset_id):
+        if not _SAFE_ID.match(dataset_id or ''):
+            return None
+        return os.path.join(self.root, dataset_id)
+
+    def writer(self, dataset_id):
+        """Return a DatasetWriter for a new dataset, or None if it is already stored"""
+        if self._directory(dataset_id) is None:
+            raise ValueError(f'Invalid dataset id: {dataset_id}')
+        if self.exists(dataset_id):
+            return None
+        return DatasetWriter(self, dataset_id)
+
+    def _write(self, dataset_id, df, layout, extra):
+        writer = self.writer(dataset_id)
+        if writer is None:
+            return self.metadata(dataset_id)
+        try:
+            writer.write(df)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close(layout, extra)
+
+    def _load_part(self, dataset_id):
+        # Each directory holds only its own rows, whatever parts its meta lists
+        meta = self.metadata(dataset_id)
+        if meta is None:
+            print(f"Dataset part {dataset_id} is missing")
+            return None
+        return self._load_directory(self._directory(dataset_id), meta)
+
+    def _load_compacted(self, dataset_id, parts):
+        # Written once, part by part, so neither this nor later loads hold the history in memory
+        directory = os.path.join(self._directory(dataset_id), COMPACT_DIR)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            writer = DatasetWriter(self, dataset_id, directory)
+            try:
+                for part_id in parts:
+                    part = self._load_part(part_id)
+                    if part is None:
+                        writer.abort()
+                        return None
+                    writer.write(part)
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+        with open(os.path.join(directory, META_FILE)) as f:
+            return self._load_directory(directory, json.load(f))
+
+    def _load_directory(self, directory, meta):
+        if meta['format'] == 'arrow':
+            if pa is None:
+                print(f"Dataset {meta['dataset_id']} needs pyarrow to load")
+                return None
+            source = pa.memory_map(os.path.join(directory, ARROW_FILE), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+
+        columns = {
+            col: np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+            for i, col in enumerate(meta['columns'])
+        }
+        # copy=False keeps each column as its own block over the mapped file
+        return pd.DataFrame(columns, copy=False)
+
+
+class DatasetWriter:
+    """Writes one dataset chunk by chunk and moves it into the store on close()
+
+    Chunks must have the same columns; values are converted to the first
+    chunk's dtypes. Nothing is visible in the store until close() renames the
+    finished scratch directory into place (the dataset's directory, unless
+    another one is given).
+    """
+
+    def __init__(self, store, dataset_id, directory=None):
+        self.store = store
+        self.dataset_id = dataset_id
+        self.directory = directory or store._directory(dataset_id)
+        self.format = 'arrow' if pa is not None else 'npy'
+        self.rows = 0
+        self.columns = None
+        self.dtypes = None
+        self.attrs = {}
+        self._tmp_dir = tempfile.mkdtemp(dir=store.root, prefix='.tmp-')
+        self._files = []
+        self._arrow = None
+
+    def write(self, df):
+        if self.columns is None:
+            self._open(df)
+        elif list(df.columns) != self.columns:
+            raise ValueError(f'Expected columns {self.columns}, got {list(df.columns)}')
+
+        if self.format == 'arrow':
+            sink, writer, schema = self._arrow
+            writer.write_table(pa.Table.from_pandas(df.astype(self.dtypes), schema=schema, preserve_index=False))
+        else:
+            for f, col in zip(self._files, self.columns):
+                f.write(np.ascontiguousarray(df[col].to_numpy(dtype=self.dtypes[col])).tobytes())
+        self.rows += len(df)
+
+    def close(self, layout=None, extra=None):
+        """Finish the files and add the dataset to the store; returns its metadata"""
+        if self.columns is None:
+            self._open(pd.DataFrame())
+        meta = {
+            'dataset_id': self.dataset_id,
+            'format': self.format,
+            'rows': self.rows,
+            'columns': self.columns,
+            'dtypes': {col: str(dtype) for col, dtype in self.dtypes.items()},
+            'attrs': self.attrs,
+            'created_at': time.time()
+        }
+        meta.update(layout or {})
+        meta.update(extra or {})
+
+        directory = self.directory
+        try:
+            if self.format == 'arrow':
+                self._arrow[1].close()
+                self._arrow[0].close()
+            else:
+                for f, col in zip(self._files, self.columns):
+                    f.seek(0)
+                    f.write(_npy_header(self.dtypes[col], self.rows))
+                    f.close()
+            with open(os.path.join(self._tmp_dir, META_FILE), 'w') as f:
+                json.dump(meta, f)
+            # Build the dataset in a scratch directory and rename it into place in one step
+            os.rename(self._tmp_dir, directory)
+        except OSError:
+            # Another worker stored the same dataset first
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                raise
+            return self.store.metadata(self.dataset_id)
+        return meta
+
+    def abort(self):
+        """Drop everything written so far"""
+        for f in self._files:
+            f.close()
+        if self._arrow is not None:
+            self._arrow[0].close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _open(self, df):
+        self.columns = list(df.columns)
+        self.dtypes = dict(df.dtypes.items())
+        self.attrs = dict(df.attrs)
+        if self.format == 'arrow':
+            sink = pa.OSFile(os.path.join(self._tmp_dir, ARROW_FILE), 'wb')
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            self._arrow = (sink, pa.ipc.new_file(sink, schema), schema)
+        else:
+            for i, col in enumerate(self.columns):
+                if not isinstance(self.dtypes[col], np.dtype) or self.dtypes[col].hasobject:
+                    raise ValueError(f'Column {col} has dtype {self.dtypes[col]}, which cannot be stored as .npy')
+                f = open(os.path.join(self._tmp_dir, f'{i}.npy'), 'wb')
+                f.write(_npy_header(self.dtypes[col], 0))
+                self._files.append(f)
+
+
+def _npy_header(dtype, rows):
+    # Version 1.0 .npy header padded with spaces to NPY_HEADER_BYTES
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                   'shape': (rows,)})
+    header = header.ljust(NPY_HEADER_BYTES - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
@@ -0,0 +1,116 @@
+"""
+Permutation feature importance, computed once per model and cached.
+
+A feature's importance is the drop in held-out R² when its column is
+shuffled. Each feature is scored as a separate task: all of its shuffled
+repeats are stacked into one batch so the model predicts them in a single
+call, and the tasks run in a pool of worker processes that load the model
+memory-mapped from the registry. Results are stored next to the model, so
+every later chart or API request just reads them.
+"""
+
+import concurrent.futures
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score
+
+from model_registry import MODEL_FILE
+
+ARTIFACT = 'permutation_importance'
+
+# Per worker process: the models it has loaded, by (path, modification time)
+_worker_models = {}
+
+
+def score_feature(model, X, y, feature, n_repeats, seed):
+    """Return the R² of the model on X with column `feature` shuffled, once per repeat"""
+    rng = np.random.default_rng(seed)
+    stacked = np.tile(X, (n_repeats, 1))
+    for repeat in range(n_repeats):
+        rows = slice(repeat * len(X), (repeat + 1) * len(X))
+        stacked[rows, feature] = rng.permutation(X[:, feature])
+    if hasattr(model, 'feature_names_in_'):
+        stacked = pd.DataFrame(stacked, columns=model.feature_names_in_)
+    predictions = model.predict(stacked).reshape(n_repeats, len(X))
+    return [float(r2_score(y, predictions[repeat])) for repeat in range(n_repeats)]
+
+
+def _score_feature_from_path(model_path, mtime_ns, X, y, feature, n_repeats, seed):
+    # A model registered again under the same id replaces the file, so the path alone is not enough
+    key = (model_path, mtime_ns)
+    model = _worker_models.get(key)
+    if model is None:
+        _worker_models.clear()  # one model at a time keeps worker memory flat
+        model = _worker_models[key] = joblib.load(model_path, mmap_mode='r')
+    return score_feature(model, X, y, feature, n_repeats, seed)
+
+
+class PermutationImportance:
+    """Computes permutation importances in a process pool and caches them per model id"""
+
+    def __init__(self, registry, max_workers=1, n_repeats=5):
+        self.registry = registry
+        self.max_workers = max_workers
+        self.n_repeats = n_repeats
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def get(self, model_id):
+        """Return the cached importances of a model, or None"""
+        return self.registry.load_artifact(model_id, ARTIFACT)
+
+    def compute(self, model_id, model, X_test, y_test, features):
+        """Return the model's importances on (X_test, y_test), computing them on a cache miss"""
+        cached = self.get(model_id)
+        if cached is not None:
+            return cached
+
+        X = np.asarray(X_test, dtype=np.float64)
+        y = np.asarray(y_test, dtype=np.float64)
+        baseline = float(r2_score(y, model.predict(X_test)))
+        seeds = np.random.SeedSequence(0).generate_state(X.shape[1])
+
+        model_path = os.path.join(self.registry.root, model_id, MODEL_FILE)
+        scores = None
+        if self.max_workers > 1 and os.path.exists(model_path):
+            try:
+                mtime_ns = os.stat(model_path).st_mtime_ns
+                pool = self._get_pool()
+                futures = [pool.submit(_score_feature_from_path, model_path, mtime_ns, X, y, j, self.n_repeats,
+                                       int(seeds[j]))
+                           for j in range(X.shape[1])]
+                scores = [future.result() for future in futures]
+            except (BrokenProcessPool, OSError) as e:
+                print(f"Importance pool failed, scoring serially: {e}")
+                self.shutdown()
+        if scores is None:
+            scores = [score_feature(model, X, y, j, self.n_repeats, int(seeds[j])) for j in range(X.shape[1])]
+
+        drops = baseline - np.asarray(scores)
+        result = {
+            'features': list(features),
+            'baseline_r2': baseline,
+            'n_repeats': self.n_repeats,
+            'test_rows': len(X),
+            'mean': drops.mean(axis=1).tolist(),
+            'std': drops.std(axis=1).tolist()
+        }
+        self.registry.save_artifact(model_id, ARTIFACT, result)
+        return result
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
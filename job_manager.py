@@ -0,0 +1,124 @@
+"""
+Background analysis jobs with a bounded local worker pool.
+
+Job status is written to small JSON files so any gunicorn worker can report
+on a job, while the jobs themselves run on a bounded thread pool inside the
+worker that accepted them.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Jobs whose status has not been touched for this long are treated as dead
+STALE_AFTER = 15 * 60
+
+# Running jobs refresh their status this often, so long stages never look stale
+HEARTBEAT_INTERVAL = 60
+
+
+class QueueFullError(Exception):
+    """Raised when the job backlog is at capacity"""
+
+
+class JobManager:
+    """Runs jobs on a bounded pool and tracks their state on disk"""
+
+    def __init__(self, root, max_workers=1, max_queue=4):
+        self.root = root
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._active = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def submit(self, job_id, func, *args):
+        """
+        Queue func(progress, *args) under job_id and return (status, deduplicated).
+
+        func reports progress by calling progress(stage) and returns the job
+        result. A submission whose job is already queued or running is not
+        started again; its current status is returned instead.
+        """
+        with self._lock:
+            status = self.status(job_id)
+            if job_id in self._active or self._in_flight(status):
+                return status, True
+            if len(self._active) >= self.max_workers + self.max_queue:
+                raise QueueFullError(f'{len(self._active)} jobs pending')
+            self._active.add(job_id)
+            status = self._write(job_id, state='queued', stage=None, submitted_at=time.time())
+
+        self._executor.submit(self._run, job_id, func, args)
+        return status, False
+
+    def status(self, job_id):
+        """Return the stored status of a job, or None if it is unknown"""
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pending(self):
+        with self._lock:
+            return len(self._active)
+
+    def _run(self, job_id, func, args):
+        def progress(stage):
+            self._write(job_id, state='running', stage=stage)
+
+        def heartbeat():
+            while not finished.wait(HEARTBEAT_INTERVAL):
+                self._write(job_id)
+
+        finished = threading.Event()
+        threading.Thread(target=heartbeat, name=f'job-heartbeat-{job_id}', daemon=True).start()
+        try:
+            self._write(job_id, state='running', started_at=time.time())
+            result = func(progress, *args)
+            self._write(job_id, state='done', stage='done', result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._write(job_id, state='failed', error=str(e), finished_at=time.time())
+        finally:
+            finished.set()
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _in_flight(self, status):
+        # Another worker may own the job; trust its status unless it has gone stale
+        return (status is not None and status.get('state') in ('queued', 'running')
+                and time.time() - status.get('updated_at', 0) < STALE_AFTER)
+
+    def _write(self, job_id, **fields):
+        # Serialised so a heartbeat cannot write back a stage that progress() just replaced
+        with self._write_lock:
+            status = self.status(job_id) or {'job_id': job_id}
+            if fields.get('state') == 'queued':
+                # A resubmitted job starts from a clean slate
+                status = {'job_id': job_id}
+            status.update(fields)
+            status['updated_at'] = time.time()
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(status, f)
+            os.replace(tmp_path, self._path(job_id))
+            return status
+
+    def _path(self, job_id):
+        if not _SAFE_ID.match(job_id or ''):
+            return None
+        return os.path.join(self.root, f'{job_id}.json')
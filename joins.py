@@ -0,0 +1,212 @@
+"""
+Merge of the two OWID exports on compact integer keys.
+
+Instead of hashing (Entity, Year, Code) object tuples, each row's key is
+packed into one int64: the interned (Entity, Code) pair in the high bits
+and the year in the low 16 bits. The join is then a sorted lookup over two
+int64 arrays (OWID exports are already sorted, so usually no sort is
+needed), and the output frame is gathered column by column in a single
+pass with incomplete rows and the Code column never materialized.
+
+Categorical keys (what ingest produces for OWID uploads) are packed from
+their existing codes, so the strings are never touched row by row.
+"""
+
+import numpy as np
+import pandas as pd
+
+JOIN_COLUMNS = ['Entity', 'Year', 'Code']
+YEAR_BITS = 16
+YEAR_OFFSET = 1 << (YEAR_BITS - 1)
+
+
+def intern_columns(col1, col2):
+    """Map two string columns onto shared integer codes
+
+    Categorical columns reuse their existing codes; anything else is
+    factorized once. Missing values get a code of their own, matching
+    pd.merge, which joins NaN keys to each other.
+    """
+    if (isinstance(col1.dtype, pd.CategoricalDtype) and isinstance(col2.dtype, pd.CategoricalDtype)
+            and col1.cat.categories.equals(col2.cat.categories)):
+        # Same dictionary on both sides (e.g. two exports of one OWID release): codes already agree
+        n_codes = len(col1.cat.categories)
+        return [np.where(codes < 0, n_codes, codes).astype(np.int64)
+                for codes in (col1.cat.codes.to_numpy(), col2.cat.codes.to_numpy())] + [n_codes + 1]
+    codes, uniques = [], []
+    for col in (col1, col2):
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            codes.append(col.cat.codes.to_numpy())
+            uniques.append(col.cat.categories)
+        else:
+            col_codes, col_uniques = pd.factorize(col)
+            codes.append(col_codes)
+            uniques.append(pd.Index(col_uniques))
+
+    # Only the (small) dictionaries are reconciled, never the rows
+    shared = uniques[0].append(uniques[1]).unique()
+    missing_code = len(shared)
+    mapped = []
+    for col_codes, col_uniques in zip(codes, uniques):
+        lookup = np.append(shared.get_indexer(col_uniques), missing_code).astype(np.int64)
+        mapped.append(lookup[col_codes])  # code -1 (missing) picks the last slot
+    return mapped[0], mapped[1], missing_code + 1
+
+
+def pack_keys(df1, df2):
+    """Return (keys1, keys2) as int64 arrays, or None if the keys cannot be packed"""
+    years = []
+    for df in (df1, df2):
+        if not pd.api.types.is_integer_dtype(df['Year']):
+            return None
+        year = df['Year'].to_numpy(dtype=np.int64)
+        if len(year) and (year.min() < -YEAR_OFFSET or year.max() >= YEAR_OFFSET):
+            return None
+        years.append(year + YEAR_OFFSET)
+
+    entity1, entity2, n_entities = intern_columns(df1['Entity'], df2['Entity'])
+    code1, code2, n_codes = intern_columns(df1['Code'], df2['Code'])
+    if n_entities * n_codes >= 1 << (63 - YEAR_BITS):
+        return None
+
+    keys1 = ((entity1 * n_codes + code1) << YEAR_BITS) | years[0]
+    keys2 = ((entity2 * n_codes + code2) << YEAR_BITS) | years[1]
+    return keys1, keys2
+
+
+def join_indices(keys1, keys2):
+    """Inner-join two int64 key arrays, returning matching row positions in keys1 order
+
+    keys2 must be unique; returns None otherwise. Already-sorted input (the
+    usual case for OWID exports) skips the sort entirely.
+    """
+    if len(keys2) and np.all(keys2[1:] > keys2[:-1]):
+        order2 = None
+        sorted2 = keys2
+    else:
+        order2 = np.argsort(keys2, kind='stable')
+        sorted2 = keys2[order2]
+        if (sorted2[1:] == sorted2[:-1]).any():
+            return None
+
+    if len(sorted2) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    pos = np.minimum(np.searchsorted(sorted2, keys1), len(sorted2) - 1)
+    idx1 = np.flatnonzero(sorted2[pos] == keys1)
+    idx2 = pos[idx1]
+    if order2 is not None:
+        idx2 = order2[idx2]
+    return idx1, idx2
+
+
+def merge_datasets(df1, df2):
+    """Inner-join df1 and df2 on Entity/Year/Code, drop incomplete rows and the Code column
+
+    Equivalent to pd.merge(...).dropna().drop('Code', axis=1) with a fresh
+    index, including the left-frame row order. Falls back to exactly that
+    when the right-hand keys are not unique or cannot be packed.
+    """
+    right_columns = [col for col in df2.columns if col not in JOIN_COLUMNS]
+    keys = pack_keys(df1, df2)
+    # Overlapping value columns would need pandas' _x/_y suffixing
+    if keys is None or set(right_columns) & set(df1.columns):
+        return _merge_with_pandas(df1, df2)
+
+    indices = join_indices(*keys)
+    if indices is None:
+        return _merge_with_pandas(df1, df2)
+    idx1, idx2 = indices
+
+    # Drop rows with any missing value (Code included) before materializing anything
+    valid = np.ones(len(idx1), dtype=bool)
+    for col in df1.columns:
+        valid &= ~pd.isna(df1[col].array)[idx1]
+    for col in right_columns:
+        valid &= ~pd.isna(df2[col].array)[idx2]
+    idx1, idx2 = idx1[valid], idx2[valid]
+
+    # Gather each output column exactly once; copy=False skips block consolidation
+    columns = {col: df1[col].array.take(idx1) for col in df1.columns if col != 'Code'}
+    columns.update({col: df2[col].array.take(idx2) for col in right_columns})
+    return pd.DataFrame(columns, copy=False)
+
+
+def _merge_with_pandas(df1, df2):
+    df = pd.merge(df1, df2, on=JOIN_COLUMNS)
+    df.dropna(inplace=True)
+    df.drop(columns='Code', inplace=True)
+    # Same fresh index as the packed path
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def merge_sorted_chunks(chunks1, chunks2):
+    """Yield merge_datasets of two chunked inputs, chunk by chunk
+
+    Both inputs must be sorted by (Entity, Year), as OWID exports are;
+    ValueError is raised as soon as a row is found out of order. Rows are
+    joined once every row with the same or a smaller key has been read from
+    both sides, so only about a chunk of each input is held at a time.
+    """
+    inputs = [_sorted_chunks(chunks1, 'file1'), _sorted_chunks(chunks2, 'file2')]
+    buffers = [None, None]
+    done = [False, False]
+    while True:
+        for side in (0, 1):
+            while not done[side] and (buffers[side] is None or len(buffers[side]) == 0):
+                chunk = next(inputs[side], None)
+                if chunk is None:
+                    done[side] = True
+                else:
+                    buffers[side] = chunk if buffers[side] is None else _concat(buffers[side], chunk)
+        # An inner join has nothing left once either side runs out
+        if any(done[side] and (buffers[side] is None or len(buffers[side]) == 0) for side in (0, 1)):
+            return
+
+        # Every key up to the smaller of the sides' last keys is complete on both
+        bounds = [_last_key(buffers[side]) for side in (0, 1) if not done[side]]
+        if bounds:
+            boundary = min(bounds)
+            cuts = [_count_up_to(buffers[side], boundary) for side in (0, 1)]
+        else:
+            cuts = [len(buffers[0]), len(buffers[1])]
+
+        if cuts[0] and cuts[1]:
+            merged = merge_datasets(buffers[0].iloc[:cuts[0]], buffers[1].iloc[:cuts[1]])
+            if len(merged):
+                yield merged
+        buffers = [buffers[side].iloc[cuts[side]:] for side in (0, 1)]
+
+
+def _sorted_chunks(chunks, name):
+    # Check (Entity, Year) order within and across chunks while passing them on
+    previous = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        entities = chunk['Entity'].to_numpy(dtype=str)
+        years = chunk['Year'].to_numpy()
+        ordered = (entities[1:] > entities[:-1]) | ((entities[1:] == entities[:-1]) & (years[1:] >= years[:-1]))
+        if not ordered.all() or (previous is not None and (entities[0], years[0]) < previous):
+            raise ValueError(f'{name} must be sorted by Entity and Year for chunked processing')
+        previous = (entities[-1], years[-1])
+        yield chunk
+
+
+def _concat(left, right):
+    # Categorical keys from different chunks have different categories; objects keep NaN as NaN
+    frames = [frame.astype({col: object for col in ('Entity', 'Code')
+                            if col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype)})
+              for frame in (left, right)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _last_key(df):
+    return str(df['Entity'].iloc[-1]), df['Year'].iloc[-1]
+
+
+def _count_up_to(df, key):
+    """Number of leading rows of a (Entity, Year)-sorted frame with a key <= key"""
+    entities = df['Entity'].to_numpy(dtype=str)
+    years = df['Year'].to_numpy()
+    return int(((entities < key[0]) | ((entities == key[0]) & (years <= key[1]))).sum())
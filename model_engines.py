@@ -0,0 +1,159 @@
+"""
+Interchangeable regression engines for the mental fitness model.
+
+Each engine builds an unfitted scikit-learn estimator from the training
+options. fit_engine trains and times one engine on a prepared split, and
+select_engine trains several side by side in worker processes within a
+wall-clock budget and keeps the one with the best test R².
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.inspection import permutation_importance
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Rows used to estimate importances for engines that do not expose any
+IMPORTANCE_SAMPLE_ROWS = 2000
+
+
+# Fixed seeds make a model id (a hash of dataset and config) name one model
+RANDOM_STATE = 0
+
+
+def _random_forest(n_estimators, n_jobs):
+    return RandomForestRegressor(n_estimators=n_estimators, n_jobs=n_jobs, random_state=RANDOM_STATE)
+
+
+def _hist_gradient_boosting(n_estimators, n_jobs):
+    # n_estimators maps onto boosting iterations; threads are set by OpenMP
+    return HistGradientBoostingRegressor(max_iter=n_estimators, random_state=RANDOM_STATE)
+
+
+def _ridge(n_estimators, n_jobs):
+    return make_pipeline(StandardScaler(), Ridge())
+
+
+ENGINES = {
+    'random_forest': _random_forest,
+    'hist_gradient_boosting': _hist_gradient_boosting,
+    'ridge': _ridge
+}
+AUTO_ENGINE = 'auto'
+
+
+def build_model(engine, n_estimators=100, n_jobs=None, params=None):
+    """Build an unfitted estimator, with params overriding the engine's defaults"""
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine: {engine}')
+    model = ENGINES[engine](n_estimators, n_jobs)
+    if params:
+        model.set_params(**params)
+    return model
+
+
+def evaluate(y_true, y_pred):
+    mse = mean_squared_error(y_true, y_pred)
+    return {
+        'mse': mse,
+        'rmse': np.sqrt(mse),
+        'r2': r2_score(y_true, y_pred)
+    }
+
+
+def fit_engine(engine, split, n_estimators=100, n_jobs=None, model=None, params=None):
+    """Fit one engine on split = (X_train, X_test, y_train, y_test) and time it
+
+    A prebuilt (e.g. warm-started) model can be passed instead of building one.
+    """
+    X_train, X_test, y_train, y_test = split
+    model = model if model is not None else build_model(engine, n_estimators, n_jobs, params)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    y_train_pred = model.predict(X_train)
+    start = time.perf_counter()
+    y_test_pred = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    return {
+        'engine': engine,
+        'model': model,
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'predict_us_per_row': predict_seconds / max(len(X_test), 1) * 1e6,
+        'train_metrics': evaluate(y_train, y_train_pred),
+        'test_metrics': evaluate(y_test, y_test_pred)
+    }
+
+
+def select_engine(split, engines=None, time_budget=30, n_estimators=100):
+    """Fit engines concurrently and return (best result, report per engine)
+
+    Each engine is fitted on one core in its own worker process (joblib
+    cannot start threads in pool workers anyway). Engines still fitting
+    when time_budget seconds have passed are reported as timed out and their
+    processes are terminated, so nothing keeps running after the budget.
+    The best result is None when nothing finished in time.
+    """
+    engines = engines or list(ENGINES)
+    deadline = time.monotonic() + time_budget
+    results, report = [], {}
+    pool = multiprocessing.Pool(len(engines))
+    try:
+        pending = {
+            engine: pool.apply_async(fit_engine, (engine, split, n_estimators, 1))
+            for engine in engines
+        }
+        while pending and time.monotonic() < deadline:
+            for engine, future in list(pending.items()):
+                if not future.ready():
+                    continue
+                del pending[engine]
+                try:
+                    result = future.get()
+                except Exception as e:
+                    report[engine] = {'status': 'failed', 'error': str(e)}
+                    continue
+                results.append(result)
+                report[engine] = dict({k: v for k, v in result.items() if k not in ('engine', 'model')},
+                                      status='done')
+            if pending:
+                time.sleep(0.05)
+        for engine in pending:
+            report[engine] = {'status': 'timed_out'}
+    finally:
+        # terminate() stops engines still fitting past the budget
+        pool.terminate()
+        pool.join()
+
+    best = max(results, key=lambda r: r['test_metrics']['r2'], default=None)
+    return best, {engine: report[engine] for engine in engines}
+
+
+def feature_importances(model, X=None, y=None):
+    """Return one importance score per feature for any engine
+
+    Tree ensembles report their own impurity importances and linear models
+    their absolute standardized coefficients; anything else gets permutation
+    importances on a sample of (X, y).
+    """
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_)
+    coef = getattr(model[-1], 'coef_', None) if hasattr(model, 'steps') else getattr(model, 'coef_', None)
+    if coef is not None:
+        scores = np.abs(np.ravel(coef))
+    else:
+        if len(X) > IMPORTANCE_SAMPLE_ROWS:
+            sample = np.random.default_rng(0).choice(len(X), IMPORTANCE_SAMPLE_ROWS, replace=False)
+            X, y = X.iloc[sample], y.iloc[sample]
+        scores = np.clip(permutation_importance(model, X, y, n_repeats=3, random_state=0).importances_mean, 0, None)
+    total = scores.sum()
+    return scores / total if total > 0 else scores
@@ -0,0 +1,202 @@
+"""
+Persistent on-disk registry of trained models.
+
+Each model lives in <root>/<model_id>/ as an uncompressed joblib file (so
+its arrays can be memory-mapped on load) next to a meta.json holding the
+feature schema, metrics and training details. Random forests are also
+exported as a CompactForest in <root>/<model_id>/forest/ for fast
+prediction. Workers load models lazily and keep the most recently used ones
+in memory; only the max_models most recently registered stay on disk.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+from compact_forest import CompactForest
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+MODEL_FILE = 'model.joblib'
+META_FILE = 'meta.json'
+FOREST_DIR = 'forest'
+
+
+class ModelRegistry:
+    """Stores models with their metadata and keeps a warm in-memory LRU"""
+
+    def __init__(self, root, max_loaded=4, max_models=50):
+        self.root = root
+        self.max_loaded = max_loaded
+        self.max_models = max_models
+        self._loaded = OrderedDict()
+        self._compact = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def register(self, model_id, model, features, metrics, extra=None, compact=None):
+        """Persist a model, its metadata and optional CompactForest, returning the metadata"""
+        directory = self._directory(model_id)
+        if directory is None:
+            raise ValueError(f'Invalid model id: {model_id}')
+        os.makedirs(directory, exist_ok=True)
+
+        meta = {
+            'model_id': model_id,
+            'model_type': type(model).__name__,
+            'features': list(features),
+            'metrics': metrics,
+            'created_at': time.time()
+        }
+        meta.update(extra or {})
+
+        # Artifacts derived from a previous model under this id no longer apply
+        for name in os.listdir(directory):
+            if name.endswith('.json') and name != META_FILE:
+                os.remove(os.path.join(directory, name))
+
+        # Write both files atomically so concurrent readers never see a partial model
+        self._atomic_write(os.path.join(directory, MODEL_FILE), lambda path: joblib.dump(model, path))
+        if compact is not None:
+            self._save_compact(directory, compact)
+            meta['compact_bytes'] = compact.nbytes
+        else:
+            shutil.rmtree(os.path.join(directory, FOREST_DIR), ignore_errors=True)
+        self._atomic_write(os.path.join(directory, META_FILE), lambda path: self._dump_json(meta, path))
+
+        with self._lock:
+            self._loaded[model_id] = (model, meta)
+            self._loaded.move_to_end(model_id)
+            self._compact.pop(model_id, None)
+            self._evict()
+        self._prune()
+        return meta
+
+    def load(self, model_id):
+        """Return (model, meta), loading from disk on first use; None if unknown"""
+        with self._lock:
+            if model_id in self._loaded:
+                self._loaded.move_to_end(model_id)
+                return self._loaded[model_id]
+
+        meta = self.metadata(model_id)
+        if meta is None:
+            return None
+        model = joblib.load(os.path.join(self._directory(model_id), MODEL_FILE), mmap_mode='r')
+
+        with self._lock:
+            self._loaded[model_id] = (model, meta)
+            self._loaded.move_to_end(model_id)
+            self._evict()
+        return model, meta
+
+    def load_compact(self, model_id):
+        """Return the model's memory-mapped CompactForest, or None if it has none"""
+        with self._lock:
+            if model_id in self._compact:
+                self._compact.move_to_end(model_id)
+                return self._compact[model_id]
+
+        directory = self._directory(model_id)
+        if directory is None or not os.path.isdir(os.path.join(directory, FOREST_DIR)):
+            return None
+        forest = CompactForest.load(os.path.join(directory, FOREST_DIR))
+
+        with self._lock:
+            self._compact[model_id] = forest
+            self._compact.move_to_end(model_id)
+            self._evict()
+        return forest
+
+    def load_artifact(self, model_id, name):
+        """Return a JSON artifact stored next to the model, or None"""
+        directory = self._directory(model_id)
+        if directory is None:
+            return None
+        try:
+            with open(os.path.join(directory, f'{name}.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_artifact(self, model_id, name, data):
+        """Store a JSON artifact (e.g. derived scores) next to the model"""
+        directory = self._directory(model_id)
+        if directory is None or not os.path.isdir(directory):
+            raise ValueError(f'Unknown model: {model_id}')
+        self._atomic_write(os.path.join(directory, f'{name}.json'), lambda path: self._dump_json(data, path))
+
+    def metadata(self, model_id):
+        directory = self._directory(model_id)
+        if directory is None:
+            return None
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_models(self):
+        """Return metadata for every registered model, newest first"""
+        models = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                meta = self.metadata(entry.name)
+                if meta is not None:
+                    models.append(meta)
+        return sorted(models, key=lambda m: m.get('created_at', 0), reverse=True)
+
+    def _directory(self, model_id):
+        if not _SAFE_ID.match(model_id or ''):
+            return None
+        return os.path.join(self.root, model_id)
+
+    def _evict(self):
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+        while len(self._compact) > self.max_loaded:
+            self._compact.popitem(last=False)
+
+    def _prune(self):
+        """Delete the least recently registered models beyond max_models"""
+        models = self.list_models()
+        for meta in models[self.max_models:]:
+            shutil.rmtree(self._directory(meta['model_id']), ignore_errors=True)
+            with self._lock:
+                self._loaded.pop(meta['model_id'], None)
+                self._compact.pop(meta['model_id'], None)
+
+    @staticmethod
+    def _save_compact(directory, compact):
+        # Swap the whole array directory in so readers never mix two exports
+        tmp_dir = tempfile.mkdtemp(dir=directory, prefix='.tmp-')
+        target = os.path.join(directory, FOREST_DIR)
+        try:
+            compact.save(tmp_dir)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.rename(tmp_dir, target)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _dump_json(data, path):
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _atomic_write(target, write):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,242 @@
+"""
+Single-pass, mergeable accumulators for summary statistics.
+
+Moments keeps the count, mean vector and co-moment matrix (sum of outer
+products of deviations from the mean) of a set of columns, plus their
+minima and maxima. A chunk is summarised on its own and folded in with
+Chan et al.'s pairwise update, so means, variances and the full Pearson
+correlation matrix come out of one pass over any number of chunks without
+the cancellation of raw sums of squares; two accumulators built elsewhere
+(another chunk, another process) merge exactly. Histogram counts values on
+a fixed-width grid: one laid over a known range counts any split of the
+values into chunks exactly like a single pass, and one started from the
+first chunk grows by whole bins as values fall outside it, merging runs of
+adjacent bins when given a bin limit. Both round-trip through plain
+JSON-ready dicts. ReservoirSample keeps a uniform random sample of bounded
+size from any number of chunks.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Moments:
+    """Count, mean, co-moments, min and max of a fixed set of columns"""
+
+    def __init__(self, n_columns):
+        self.count = 0
+        self.mean = np.zeros(n_columns)
+        self.comoment = np.zeros((n_columns, n_columns))
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    @classmethod
+    def from_values(cls, values):
+        """Summarise a 2-D array of rows; rows with a missing value are skipped"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values).all(axis=1)]
+        moments = cls(values.shape[1])
+        if len(values):
+            moments.count = len(values)
+            moments.mean = values.mean(axis=0)
+            deviations = values - moments.mean
+            moments.comoment = deviations.T @ deviations
+            moments.min = values.min(axis=0)
+            moments.max = values.max(axis=0)
+        return moments
+
+    def update(self, values):
+        """Fold in a chunk of rows"""
+        return self.merge(Moments.from_values(values))
+
+    def merge(self, other):
+        """Fold in another accumulator over the same columns"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.comoment = other.count, other.mean.copy(), other.comoment.copy()
+            self.min, self.max = other.min.copy(), other.max.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.count * other.count / count)
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def variance(self):
+        """Sample variance per column (NaN with fewer than two rows)"""
+        if self.count < 2:
+            return np.full(len(self.mean), np.nan)
+        return np.diag(self.comoment) / (self.count - 1)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def correlation(self):
+        """Pearson correlation matrix; NaN for constant columns"""
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.comoment / np.outer(scale, scale)
+
+    def to_dict(self):
+        finite = self.count > 0
+        return {
+            'count': int(self.count),
+            'mean': self.mean.tolist(),
+            'comoment': self.comoment.tolist(),
+            'min': self.min.tolist() if finite else None,
+            'max': self.max.tolist() if finite else None
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        moments = cls(len(data['mean']))
+        moments.count = data['count']
+        moments.mean = np.asarray(data['mean'], dtype=np.float64)
+        moments.comoment = np.asarray(data['comoment'], dtype=np.float64)
+        if data['min'] is not None:
+            moments.min = np.asarray(data['min'], dtype=np.float64)
+            moments.max = np.asarray(data['max'], dtype=np.float64)
+        return moments
+
+
+class Histogram:
+    """Counts on a grid of equal-width bins that extends by whole bins as needed
+
+    With max_bins, a grid that would grow past that many bins first merges
+    every `factor` adjacent bins into one, so counts stay exact and the bin
+    count stays bounded however the values arrive.
+    """
+
+    def __init__(self, edges, counts=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, np.int64) if counts is None else np.asarray(counts, np.int64)
+
+    @classmethod
+    def from_values(cls, values, bins):
+        """Histogram of values over their own range, or None when there are none"""
+        values = _finite(values)
+        if len(values) == 0:
+            return None
+        histogram = cls(np.histogram_bin_edges(values, bins=bins))
+        return histogram.update(values)
+
+    @classmethod
+    def from_range(cls, low, high, bins):
+        """Empty histogram with the grid from_values would lay over values spanning low..high"""
+        return cls(np.histogram_bin_edges(np.array([low, high], dtype=np.float64), bins=bins))
+
+    @property
+    def width(self):
+        return self.edges[1] - self.edges[0]
+
+    def update(self, values, max_bins=None):
+        """Count more values, growing the grid to cover them"""
+        values = _finite(values)
+        if len(values) == 0:
+            return self
+        self._extend(values.min(), values.max(), max_bins)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+        return self
+
+    def coarsen(self, max_bins):
+        """Merge adjacent bins until there are at most max_bins"""
+        factor = -(-len(self.counts) // max_bins)
+        if factor > 1:
+            self._merge_bins(factor)
+        return self
+
+    def _merge_bins(self, factor):
+        # Runs of `factor` bins from the left edge; the last run is padded with empty bins
+        starts = np.arange(0, len(self.counts), factor)
+        # Existing edges are kept as they are so no counted value changes bins
+        self.edges = np.append(self.edges[starts], self.edges[starts[-1]] + self.width * factor)
+        self.counts = np.add.reduceat(self.counts, starts)
+
+    def _extend(self, low, high, max_bins=None):
+        # Whole bins keep the existing counts valid
+        width = self.width
+        if width <= 0:
+            return
+        pad_left = max(int(np.ceil((self.edges[0] - low) / width)), 0)
+        pad_right = max(int(np.ceil((high - self.edges[-1]) / width)), 0)
+        # Widen the bins first, so the padding is counted in wider bins too
+        while max_bins and len(self.counts) + pad_left + pad_right > max_bins:
+            self._merge_bins(max(-(-(len(self.counts) + pad_left + pad_right) // max_bins), 2))
+            width = self.width
+            pad_left = max(int(np.ceil((self.edges[0] - low) / width)), 0)
+            pad_right = max(int(np.ceil((high - self.edges[-1]) / width)), 0)
+        if pad_left or pad_right:
+            self.edges = np.concatenate([
+                self.edges[0] - width * np.arange(pad_left, 0, -1),
+                self.edges,
+                self.edges[-1] + width * np.arange(1, pad_right + 1)
+            ])
+            self.counts = np.concatenate([np.zeros(pad_left, np.int64), self.counts, np.zeros(pad_right, np.int64)])
+
+    def to_dict(self):
+        return {'edges': self.edges.tolist(), 'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['edges'], data['counts'])
+
+
+class ReservoirSample:
+    """A uniform random sample of at most `size` rows from a stream of DataFrame chunks"""
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seen = 0
+        self.attrs = {}
+        self._rng = np.random.default_rng(seed)
+        self._columns = None
+        self._positions = np.empty(size, dtype=np.int64)
+        self._filled = 0
+
+    def update(self, df):
+        """Offer every row of a chunk to the sample"""
+        if len(df) == 0:
+            return self
+        if self._columns is None:
+            self.attrs = dict(df.attrs)
+            self._columns = {col: np.empty(self.size, dtype=dtype) for col, dtype in df.dtypes.items()}
+
+        # Until the sample is full every row is kept
+        take = min(self.size - self._filled, len(df))
+        rows = np.arange(take)
+        slots = self._filled + rows
+        self._filled += take
+
+        # Afterwards row t replaces a random slot with probability size / (t + 1)
+        rest = np.arange(take, len(df))
+        if len(rest):
+            picks = self._rng.integers(0, self.seen + rest + 1)
+            keep = picks < self.size
+            # When two rows pick the same slot the later one wins
+            chosen_slots, last = np.unique(picks[keep][::-1], return_index=True)
+            rows = np.concatenate([rows, rest[keep][::-1][last]])
+            slots = np.concatenate([slots, chosen_slots])
+
+        for col, values in self._columns.items():
+            values[slots] = df[col].to_numpy(dtype=values.dtype)[rows]
+        self._positions[slots] = self.seen + rows
+        self.seen += len(df)
+        return self
+
+    def frame(self):
+        """The sampled rows in their original order"""
+        if self._columns is None:
+            return pd.DataFrame()
+        order = np.argsort(self._positions[:self._filled], kind='stable')
+        df = pd.DataFrame({col: values[:self._filled][order] for col, values in self._columns.items()})
+        df.attrs.update(self.attrs)
+        return df
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.isfinite(values)]
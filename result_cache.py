@@ -0,0 +1,120 @@
+"""
+Content-addressed, size-bounded LRU cache for analysis results.
+
+Entries are keyed by a hash of the uploaded CSV payloads, so re-uploading
+the same pair of files skips parsing, training and chart rendering.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_key(*payloads):
+    """Return a hex digest identifying an ordered set of raw payloads"""
+    digest = hashlib.sha256()
+    for payload in payloads:
+        # Length-prefix each payload so (ab, c) and (a, bc) hash differently
+        digest.update(len(payload).to_bytes(8, 'big'))
+        digest.update(payload)
+    return digest.hexdigest()
+
+
+def stream_key(*streams, block_size=1 << 20):
+    """content_key of seekable file objects, read in blocks; each is rewound afterwards"""
+    digest = hashlib.sha256()
+    for stream in streams:
+        size = stream.seek(0, 2)
+        stream.seek(0)
+        digest.update(size.to_bytes(8, 'big'))
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+        stream.seek(0)
+    return digest.hexdigest()
+
+
+def estimate_size(value):
+    """Roughly estimate the memory footprint of a cached value in bytes"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    if hasattr(value, 'memory_usage'):
+        # pandas DataFrame / Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return 64
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by entry count and total size"""
+
+    def __init__(self, max_entries=16, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used entries"""
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # Values larger than the whole budget are never cached
+            if self.max_entries <= 0 or size > self.max_bytes:
+                return False
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._total_bytes -= self._sizes.pop(key)
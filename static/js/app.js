@@ -28,17 +28,22 @@ document.addEventListener('DOMContentLoaded', function() {
         showLoading();
         
         try {
-            const response = await fetch('/api/upload', {
-                method: 'POST',
-                body: formData
-            });
-            
-            const result = await response.json();
-            
-            if (result.success) {
-                displayResults(result.data);
+            // Stream sections as they are ready when the browser supports it
+            if (window.ReadableStream && window.TextDecoder) {
+                await streamResults(formData);
             } else {
-                showError(result.error || 'An error occurred while processing the files');
+                const response = await fetch('/api/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                
+                const result = await response.json();
+                
+                if (result.success) {
+                    displayResults(result.data);
+                } else {
+                    showError(result.error || 'An error occurred while processing the files');
+                }
             }
         } catch (error) {
             showError('Network error: ' + error.message);
@@ -47,6 +52,98 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Chart names sent by the server mapped to their <img> ids and fallback messages
+    const chartElements = {
+        correlation_heatmap: ['correlationHeatmap', 'Correlation heatmap could not be generated'],
+        pairplot: ['pairplot', 'Pairplot could not be generated'],
+        distribution_histogram: ['distributionHistogram', 'Distribution analysis could not be generated'],
+        time_series_analysis: ['timeSeriesAnalysis', 'Time series analysis could not be generated'],
+        feature_importance: ['featureImportance', 'Feature importance analysis could not be generated']
+    };
+
+    async function streamResults(formData) {
+        const response = await fetch('/api/upload/stream', {
+            method: 'POST',
+            body: formData
+        });
+        
+        if (!response.ok) {
+            const result = await response.json();
+            showError(result.error || 'An error occurred while processing the files');
+            return;
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const receivedCharts = new Set();
+        let buffer = '';
+        let shown = false;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Server-Sent Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!message) continue;
+                
+                if (message.event === 'error') {
+                    showError(message.data.error || 'An error occurred while processing the files');
+                    return;
+                }
+                if (!shown && message.event !== 'stage') {
+                    errorAlert.style.display = 'none';
+                    resultsSection.style.display = 'block';
+                    resultsSection.classList.add('fade-in-up');
+                    shown = true;
+                }
+                
+                if (message.event === 'stage') {
+                    uploadBtn.innerHTML = `<i class="fas fa-spinner fa-spin me-2"></i>${stageLabel(message.data.stage)}...`;
+                } else if (message.event === 'statistics') {
+                    displayStatistics(message.data);
+                    resultsSection.scrollIntoView({ behavior: 'smooth' });
+                } else if (message.event === 'model') {
+                    displayModelMetrics(message.data.model_metrics);
+                } else if (message.event === 'chart' && chartElements[message.data.name]) {
+                    const [elementId, errorText] = chartElements[message.data.name];
+                    displayVisualization(elementId, message.data.url, errorText);
+                    receivedCharts.add(message.data.name);
+                } else if (message.event === 'done') {
+                    // Charts that never arrived could not be generated
+                    Object.entries(chartElements).forEach(([name, [elementId, errorText]]) => {
+                        if (!receivedCharts.has(name)) {
+                            displayVisualization(elementId, null, errorText);
+                        }
+                    });
+                }
+            }
+        }
+    }
+
+    function parseEvent(block) {
+        let event = 'message';
+        const dataLines = [];
+        block.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        if (!dataLines.length) return null;
+        return { event: event, data: JSON.parse(dataLines.join('\n')) };
+    }
+
+    function stageLabel(stage) {
+        const labels = { parse: 'Reading files', merge: 'Merging data', train: 'Training model', render: 'Rendering charts' };
+        return labels[stage] || 'Processing';
+    }
+
     function showLoading() {
         loadingSpinner.style.display = 'block';
         resultsSection.style.display = 'none';
@@ -208,7 +305,8 @@ document.addEventListener('DOMContentLoaded', function() {
     function displayVisualization(elementId, imageData, errorMessage) {
         const imgElement = document.getElementById(elementId);
         if (imageData) {
-            imgElement.src = `data:image/png;base64,${imageData}`;
+            // Charts arrive as URLs; inline base64 is still accepted for ?charts=inline
+            imgElement.src = isChartUrl(imageData) ? imageData : `data:image/png;base64,${imageData}`;
             imgElement.alt = elementId.replace(/([A-Z])/g, ' $1').trim();
             imgElement.style.display = 'block';
             imgElement.parentElement.parentElement.style.display = 'block';
@@ -218,6 +316,10 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function isChartUrl(imageData) {
+        return imageData.startsWith('/') || imageData.startsWith('http');
+    }
+
     // File input validation
     document.getElementById('file1').addEventListener('change', function(e) {
         validateFile(e.target, 'Mental disorders data');
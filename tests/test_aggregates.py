@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import (AggregateBuilder, compute_aggregates, empty_aggregates, recount_histograms,
+                        HISTOGRAM_BINS)
+
+
+@pytest.fixture
+def processed_df():
+    # Indicators drift with the year, so early chunks cover only part of the final range
+    rng = np.random.default_rng(0)
+    countries = np.repeat(np.arange(40), 30)
+    years = np.tile(np.arange(1990, 2020), 40)
+    trend = (years - 1990) / 10
+    return pd.DataFrame({
+        'Country': countries,
+        'Year': years,
+        'mental_fitness': rng.normal(5, 1, len(years)) + trend,
+        'depression': rng.gamma(2, 1, len(years)) * (1 + trend),
+        'anxiety': rng.normal(4, 0.5, len(years)) - trend,
+        'drug_usage': rng.exponential(0.5, len(years)),
+        'alcohol': rng.uniform(0, 3, len(years)) + trend
+    }).sort_values('Year', kind='stable', ignore_index=True)
+
+
+def chunks(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+def test_chunked_aggregates_match_whole_frame(processed_df):
+    whole = compute_aggregates(processed_df)
+    chunked = compute_aggregates(processed_df, chunk_size=97)
+
+    assert chunked['histograms'] == whole['histograms']
+    assert chunked['moments']['count'] == whole['moments']['count']
+    np.testing.assert_allclose(chunked['moments']['mean'], whole['moments']['mean'])
+    np.testing.assert_allclose(chunked['moments']['comoment'], whole['moments']['comoment'], atol=1e-6)
+    assert chunked['cube']['Year']['keys'] == whole['cube']['Year']['keys']
+    np.testing.assert_allclose(chunked['cube']['Year']['sum'], whole['cube']['Year']['sum'])
+
+
+def test_whole_frame_histograms_span_the_full_range(processed_df):
+    histograms = compute_aggregates(processed_df)['histograms']
+    for indicator, histogram in histograms.items():
+        assert len(histogram['counts']) == HISTOGRAM_BINS
+        assert histogram['edges'][0] == processed_df[indicator].min()
+        assert histogram['edges'][-1] == processed_df[indicator].max()
+        assert sum(histogram['counts']) == len(processed_df)
+
+
+def test_recounted_histograms_match_whole_frame(processed_df):
+    # A builder that learns the range as it goes, like the chunked upload's first pass
+    builder = AggregateBuilder(empty_aggregates(processed_df.columns))
+    for chunk in chunks(processed_df, 100):
+        builder.update(chunk)
+    grown = builder.result()
+
+    recounted = recount_histograms(grown, chunks(processed_df, 100))
+    assert recounted['histograms'] == compute_aggregates(processed_df)['histograms']
+    assert recounted['moments'] == grown['moments']
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from joins import merge_datasets, merge_sorted_chunks
+from online_stats import Histogram, Moments, ReservoirSample
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(1)
+    n = 2500
+    return pd.DataFrame({
+        'a': rng.normal(1e6, 3, n),  # large offset: raw sums of squares would cancel badly
+        'b': rng.exponential(2, n),
+        'c': rng.integers(0, 50, n).astype(float)
+    })
+
+
+def chunks(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+def test_merged_moments_match_pandas(frame):
+    moments = Moments(frame.shape[1])
+    for chunk in chunks(frame, 313):
+        moments.merge(Moments.from_values(chunk.to_numpy()))
+
+    described = frame.describe()
+    assert moments.count == len(frame)
+    np.testing.assert_allclose(moments.mean, described.loc['mean'], rtol=1e-12)
+    np.testing.assert_allclose(moments.std(), described.loc['std'], rtol=1e-9)
+    np.testing.assert_array_equal(moments.min, described.loc['min'])
+    np.testing.assert_array_equal(moments.max, described.loc['max'])
+    np.testing.assert_allclose(moments.comoment / (len(frame) - 1), frame.cov(), rtol=1e-9)
+    np.testing.assert_allclose(moments.correlation(), frame.corr(), rtol=1e-9)
+
+
+def test_moments_skip_rows_with_missing_values(frame):
+    frame = frame.copy()
+    frame.iloc[::7, 1] = np.nan
+    moments = Moments(frame.shape[1])
+    for chunk in chunks(frame, 400):
+        moments.update(chunk.to_numpy())
+    complete = frame.dropna()
+    assert moments.count == len(complete)
+    np.testing.assert_allclose(moments.mean, complete.mean(), rtol=1e-12)
+
+
+def test_moments_round_trip_through_dict(frame):
+    moments = Moments.from_values(frame.to_numpy())
+    restored = Moments.from_dict(moments.to_dict())
+    np.testing.assert_array_equal(restored.comoment, moments.comoment)
+    assert Moments.from_dict(Moments(3).to_dict()).count == 0
+
+
+@pytest.mark.parametrize('max_bins', [None, 30])
+def test_growing_histogram_counts_every_value(frame, max_bins):
+    # Sorted values make every chunk extend the grid
+    values = np.sort(frame['b'].to_numpy())
+    histogram = Histogram.from_values(values[:100], 30)
+    for start in range(100, len(values), 250):
+        histogram.update(values[start:start + 250], max_bins)
+    histogram.update([np.nan, np.inf])
+
+    assert histogram.counts.sum() == len(values)
+    assert histogram.edges[0] <= values.min() and histogram.edges[-1] >= values.max()
+    np.testing.assert_allclose(np.diff(histogram.edges), histogram.width)
+    if max_bins:
+        assert len(histogram.counts) <= max_bins
+
+
+def test_histogram_over_range_matches_single_pass(frame):
+    values = frame['c'].to_numpy()
+    whole = Histogram.from_values(values, 20)
+    chunked = Histogram.from_range(values.min(), values.max(), 20)
+    for start in range(0, len(values), 333):
+        chunked.update(values[start:start + 333])
+    np.testing.assert_array_equal(chunked.edges, whole.edges)
+    np.testing.assert_array_equal(chunked.counts, whole.counts)
+
+
+def test_coarsen_keeps_counts(frame):
+    histogram = Histogram.from_values(frame['b'], 100).coarsen(30)
+    assert len(histogram.counts) <= 30
+    assert histogram.counts.sum() == len(frame)
+
+
+def test_reservoir_sample_size_bounds(frame):
+    sample = ReservoirSample(500, seed=3)
+    for chunk in chunks(frame.assign(row=np.arange(len(frame))), 200):
+        sample.update(chunk)
+    sampled = sample.frame()
+    assert sample.seen == len(frame)
+    assert len(sampled) == 500
+    # Distinct rows, in their original order
+    assert sampled['row'].is_unique and sampled['row'].is_monotonic_increasing
+
+    small = ReservoirSample(500).update(frame.iloc[:120]).frame()
+    pd.testing.assert_frame_equal(small, frame.iloc[:120].reset_index(drop=True))
+    assert ReservoirSample(10).frame().empty
+
+
+def test_reservoir_sample_is_roughly_uniform():
+    # Each of 1000 rows should be kept with probability 1/10
+    kept = np.zeros(1000)
+    frame = pd.DataFrame({'row': np.arange(1000)})
+    for seed in range(200):
+        sample = ReservoirSample(100, seed=seed)
+        for chunk in chunks(frame, 64):
+            sample.update(chunk)
+        kept[sample.frame()['row'].to_numpy()] += 1
+    halves = kept.reshape(2, -1).sum(axis=1) / 200
+    np.testing.assert_allclose(halves, [50, 50], rtol=0.05)
+
+
+def owid_frames():
+    rng = np.random.default_rng(2)
+    entities = ['Albania', 'Brazil', 'Chad', 'Denmark', 'Egypt', 'Fiji']
+    years = np.arange(1990, 2020)
+
+    def export(value, drop):
+        df = pd.DataFrame({
+            'Entity': np.repeat(entities, len(years)),
+            'Code': np.repeat([e[:3].upper() for e in entities], len(years)),
+            'Year': np.tile(years, len(entities)),
+            value: rng.normal(size=len(entities) * len(years))
+        })
+        df.loc[rng.random(len(df)) < 0.05, value] = np.nan
+        return df.drop(index=rng.choice(len(df), drop, replace=False)).reset_index(drop=True)
+
+    return export('x', 15), export('y', 25)
+
+
+@pytest.mark.parametrize('key_dtype', [object, 'category'])
+@pytest.mark.parametrize('size1, size2', [(7, 11), (50, 3), (1000, 1000)])
+def test_merge_sorted_chunks_matches_pandas(size1, size2, key_dtype):
+    df1, df2 = (df.astype({'Entity': key_dtype, 'Code': key_dtype}) for df in owid_frames())
+    expected = (pd.merge(df1, df2, on=['Entity', 'Year', 'Code']).dropna().drop(columns='Code')
+                .reset_index(drop=True).astype({'Entity': object}))
+
+    merged = pd.concat(merge_sorted_chunks(iter(chunks(df1, size1)), iter(chunks(df2, size2))),
+                       ignore_index=True)
+    pd.testing.assert_frame_equal(merged.astype({'Entity': object}), expected)
+    pd.testing.assert_frame_equal(merge_datasets(df1, df2).astype({'Entity': object}), expected)
+
+
+def test_merge_sorted_chunks_rejects_unsorted_input():
+    df1, df2 = owid_frames()
+    shuffled = df2.sample(frac=1, random_state=0)
+    with pytest.raises(ValueError, match='file2 must be sorted'):
+        list(merge_sorted_chunks(iter(chunks(df1, 20)), iter(chunks(shuffled, 20))))
@@ -0,0 +1,169 @@
+"""
+Per-country trend lines and short-horizon forecasts for every indicator.
+
+A dataset is reshaped into one (indicator, country, year) array with NaN
+for missing years, and a polynomial in the (centered) year is fitted to
+every series at once from the batched normal equations. The coefficients,
+residual spread and inverse normal matrices are cached per dataset, so a
+trend or forecast for one country is a lookup plus a few multiplications.
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+KEY_COLUMNS = ['Country', 'Year']
+# Two-sided 95% normal quantile for forecast intervals
+Z_95 = 1.959963984540054
+
+
+def series_tensor(df):
+    """Return (countries, years, indicators, values) with values shaped (indicator, country, year)"""
+    indicators = [col for col in df.columns if col not in KEY_COLUMNS]
+    country_idx, countries = pd.factorize(df['Country'], sort=True)
+    year_idx, years = pd.factorize(df['Year'], sort=True)
+
+    values = np.full((len(indicators), len(countries), len(years)), np.nan)
+    values[:, country_idx, year_idx] = df[indicators].to_numpy(dtype=np.float64).T
+    return np.asarray(countries), np.asarray(years, dtype=np.float64), indicators, values
+
+
+def fit_trends(df, degree=1):
+    """Fit a degree-`degree` polynomial in year to every (indicator, country) series at once"""
+    countries, years, indicators, values = series_tensor(df)
+    center = years.mean() if len(years) else 0.0
+    powers = (years - center)[:, None] ** np.arange(degree + 1)  # (year, term)
+
+    mask = ~np.isnan(values)
+    y = np.where(mask, values, 0.0)
+    weights = mask.astype(np.float64)
+    # Normal equations for all series: (X^T W X) beta = X^T W y
+    xtx = np.einsum('icy,yj,yk->icjk', weights, powers, powers)
+    xty = np.einsum('icy,yj->icj', y, powers)
+    xtx_inv = np.linalg.pinv(xtx)
+    coef = np.einsum('icjk,ick->icj', xtx_inv, xty)
+
+    n = weights.sum(axis=2)
+    fitted = np.einsum('icj,yj->icy', coef, powers)
+    sse = (weights * (y - fitted) ** 2).sum(axis=2)
+    mean = np.divide(y.sum(axis=2), n, out=np.zeros_like(n), where=n > 0)
+    sst = (weights * (y - mean[..., None]) ** 2).sum(axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residual_std = np.sqrt(sse / (n - degree - 1))
+        r2 = 1 - sse / sst
+
+    # Series with too few points cannot be fitted
+    unfit = n <= degree
+    coef[unfit] = np.nan
+    last_year = np.where(mask, years, -np.inf).max(axis=2)
+
+    return {
+        'degree': degree,
+        'center': center,
+        'countries': countries,
+        'indicators': indicators,
+        'coef': coef,
+        'xtx_inv': xtx_inv,
+        'residual_std': np.where(n > degree + 1, residual_std, np.nan),
+        'r2': np.where(unfit, np.nan, r2),
+        'n': n,
+        'last_year': last_year
+    }
+
+
+def series_trend(fit, indicator, country_pos, horizon=0):
+    """Trend coefficients and optional forecast for one series of a fit"""
+    i = fit['indicators'].index(indicator)
+    coef = fit['coef'][i, country_pos]
+    if np.isnan(coef).any():
+        return None
+
+    result = {
+        'coefficients': [float(c) for c in coef],
+        'year_center': float(fit['center']),
+        'slope_per_year': float(coef[1]) if fit['degree'] >= 1 else 0.0,
+        'r2': _float(fit['r2'][i, country_pos]),
+        'points': int(fit['n'][i, country_pos]),
+        'last_year': int(fit['last_year'][i, country_pos])
+    }
+    if horizon:
+        future = result['last_year'] + np.arange(1, horizon + 1)
+        powers = (future - fit['center'])[:, None] ** np.arange(fit['degree'] + 1)
+        predicted = powers @ coef
+        # Prediction interval: s * sqrt(1 + x^T (X^T X)^-1 x)
+        leverage = np.einsum('hj,jk,hk->h', powers, fit['xtx_inv'][i, country_pos], powers)
+        spread = Z_95 * fit['residual_std'][i, country_pos] * np.sqrt(1 + leverage)
+        result['forecast'] = [
+            {'year': int(year), 'value': float(value), 'lower': _float(value - s), 'upper': _float(value + s)}
+            for year, value, s in zip(future, predicted, spread)
+        ]
+    return result
+
+
+def _float(value):
+    return float(value) if np.isfinite(value) else None
+
+
+class TrendStore:
+    """Caches fitted trends per (dataset id, degree) in memory and as .npz files"""
+
+    def __init__(self, root, max_loaded=8):
+        self.root = root
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, dataset_id, degree, load_df):
+        """Return the fit for a dataset, fitting it from load_df() on first use (None if no data)"""
+        key = (dataset_id, degree)
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+
+        fit = self._read(dataset_id, degree)
+        if fit is None:
+            df = load_df()
+            if df is None:
+                return None
+            fit = fit_trends(df, degree)
+            self._write(dataset_id, degree, fit)
+
+        with self._lock:
+            self._loaded[key] = fit
+            self._loaded.move_to_end(key)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return fit
+
+    def _path(self, dataset_id, degree):
+        if not _SAFE_ID.match(dataset_id or ''):
+            return None
+        return os.path.join(self.root, f'{dataset_id}-deg{degree}.npz')
+
+    def _read(self, dataset_id, degree):
+        path = self._path(dataset_id, degree)
+        if path is None or not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            fit = {name: data[name] for name in data.files}
+        fit['degree'] = int(fit['degree'])
+        fit['center'] = float(fit['center'])
+        fit['indicators'] = [str(name) for name in fit['indicators']]
+        return fit
+
+    def _write(self, dataset_id, degree, fit):
+        path = self._path(dataset_id, degree)
+        if path is None:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **{name: np.asarray(value) for name, value in fit.items()})
+        os.replace(tmp_path, path)
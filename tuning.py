@@ -0,0 +1,206 @@
+"""
+Successive-halving hyperparameter search under a time and memory budget.
+
+Candidates are sampled from a per-engine search space and first scored on a
+small slice of the training rows; each rung keeps the best 1/eta of them
+and gives the survivors eta times as many rows, until the last rung trains
+on every row. Candidates are fitted in a pool of worker processes whose
+memory is capped with RLIMIT_DATA, and the pool is terminated outright when
+the time budget runs out. The search is a generator of progress events so
+callers can stream it. refit_candidate fits the winner on every training
+row under the same caps.
+"""
+
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from model_engines import build_model, evaluate, fit_engine
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SEARCH_SPACES = {
+    'random_forest': {
+        'max_depth': [None, 8, 16, 24],
+        'min_samples_leaf': [1, 2, 4, 8],
+        'max_features': [1.0, 0.7, 0.5, 'sqrt']
+    },
+    'hist_gradient_boosting': {
+        'learning_rate': [0.03, 0.06, 0.1, 0.2],
+        'max_leaf_nodes': [15, 31, 63],
+        'min_samples_leaf': [5, 10, 20, 40],
+        'l2_regularization': [0.0, 0.1, 1.0]
+    }
+}
+# Share of the training rows held out to rank candidates
+VALIDATION_SIZE = 0.2
+
+
+def sample_candidates(engines, n_candidates, seed=0):
+    """Draw distinct (engine, params) candidates spread evenly over the engines"""
+    rng = np.random.default_rng(seed)
+    candidates, seen = [], set()
+    for i in range(n_candidates * 20):
+        if len(candidates) == n_candidates:
+            break
+        engine = engines[i % len(engines)]
+        params = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACES[engine].items()}
+        key = (engine, tuple(sorted(params.items(), key=lambda item: item[0])))
+        if key not in seen:
+            seen.add(key)
+            candidates.append({'id': len(candidates), 'engine': engine, 'params': params})
+    return candidates
+
+
+def fit_candidate(engine, params, n_estimators, X_fit, y_fit, X_val, y_val):
+    """Fit one candidate on a slice of rows and score it on the validation rows"""
+    model = build_model(engine, n_estimators, n_jobs=1, params=params)
+    start = time.perf_counter()
+    model.fit(X_fit, y_fit)
+    fit_seconds = time.perf_counter() - start
+    return {'fit_seconds': fit_seconds, 'validation_metrics': evaluate(y_val, model.predict(X_val))}
+
+
+def _limit_memory(limit_bytes):
+    # The cap is on top of what the freshly started worker already uses
+    if resource is None or not limit_bytes:
+        return
+    try:
+        with open('/proc/self/status') as f:
+            used = next((int(line.split()[1]) for line in f if line.startswith('VmData:')), 0) * 1024
+    except OSError:
+        # No procfs (macOS, BSD): the peak resident size is the closest cheap baseline
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        used = peak if sys.platform == 'darwin' else peak * 1024
+    limit = used + limit_bytes
+    try:
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ValueError, OSError) as e:
+        # An initializer that raises makes the pool respawn workers forever; run unlimited instead
+        print(f"Could not set the tuning memory limit: {e}")
+
+
+def rung_sizes(n_rows, n_candidates, eta, min_rows):
+    """Rows per rung: the last rung uses all rows, each earlier one 1/eta as many"""
+    n_rungs = max(1, math.ceil(math.log(max(n_candidates, 1), eta)) + 1)
+    sizes = [max(min_rows, n_rows // eta ** (n_rungs - 1 - r)) for r in range(n_rungs)]
+    return [min(size, n_rows) for size in sizes]
+
+
+def successive_halving(X_train, y_train, engines, n_candidates=12, eta=3, time_budget=60,
+                       memory_budget_mb=None, max_workers=1, n_estimators=100, min_rows=200, seed=0):
+    """Run the search, yielding (event, payload) pairs
+
+    Events are 'rung' when a rung starts, 'candidate' as each fit finishes,
+    and finally 'result' with the best candidate (None if nothing finished)
+    and whether the time budget ran out.
+    """
+    start = time.monotonic()
+    deadline = start + time_budget
+    X_fit, X_val, y_fit, y_val = train_test_split(np.asarray(X_train, dtype=np.float64),
+                                                  np.asarray(y_train, dtype=np.float64),
+                                                  test_size=VALIDATION_SIZE, random_state=seed)
+    candidates = sample_candidates(engines, n_candidates, seed)
+    sizes = rung_sizes(len(X_fit), len(candidates), eta, min_rows)
+    per_worker = memory_budget_mb * 2 ** 20 // max_workers if memory_budget_mb else None
+
+    best, timed_out, survivors = None, False, candidates
+    pool = multiprocessing.Pool(max_workers, initializer=_limit_memory, initargs=(per_worker,))
+    try:
+        for rung, rows in enumerate(sizes):
+            yield 'rung', {'rung': rung, 'rows': rows, 'candidates': [c['id'] for c in survivors]}
+            pending = {
+                c['id']: pool.apply_async(fit_candidate, (c['engine'], c['params'], n_estimators,
+                                                          X_fit[:rows], y_fit[:rows], X_val, y_val))
+                for c in survivors
+            }
+            by_id = {c['id']: c for c in survivors}
+            scored = []
+            while pending and not timed_out:
+                for candidate_id, result in list(pending.items()):
+                    if not result.ready():
+                        continue
+                    del pending[candidate_id]
+                    candidate = dict(by_id[candidate_id], rung=rung, rows=rows)
+                    try:
+                        candidate.update(result.get(), status='done')
+                        scored.append(candidate)
+                    except MemoryError:
+                        candidate.update(status='failed', error='memory budget exceeded')
+                    except Exception as e:
+                        candidate.update(status='failed', error=str(e))
+                    yield 'candidate', candidate
+                if pending:
+                    timed_out = time.monotonic() >= deadline
+                    time.sleep(0.05)
+
+            # A candidate that completed a later rung beats any from an earlier one
+            if scored:
+                best = max(scored, key=lambda c: c['validation_metrics']['r2'])
+            if timed_out or not scored:
+                break
+            keep = max(1, math.ceil(len(scored) / eta))
+            survivors = sorted(scored, key=lambda c: c['validation_metrics']['r2'], reverse=True)[:keep]
+            survivors = [by_id[c['id']] for c in survivors]
+            if rows == sizes[-1]:
+                break
+    finally:
+        # terminate() stops fits still running past the budget
+        pool.terminate()
+        pool.join()
+
+    yield 'result', {'best': best, 'timed_out': timed_out, 'rung_sizes': sizes,
+                     'seconds': time.monotonic() - start}
+
+
+def refit_candidate(candidate, split, n_estimators, time_left, memory_budget_mb=None):
+    """Fit a candidate on split = (X_train, X_test, y_train, y_test) in a capped worker process
+
+    Returns the fit_engine result, or None when it does not finish within
+    time_left seconds; the worker is terminated either way. Exceeding the
+    memory budget raises MemoryError.
+    """
+    limit = memory_budget_mb * 2 ** 20 if memory_budget_mb else None
+    pool = multiprocessing.Pool(1, initializer=_limit_memory, initargs=(limit,))
+    try:
+        result = pool.apply_async(fit_engine, (candidate['engine'], split, n_estimators, 1),
+                                  {'params': candidate['params']})
+        result.wait(max(time_left, 0))
+        return result.get() if result.ready() else None
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    """Command line entry point: tune on a stored dataset and register the winner"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Successive-halving search on a stored dataset')
+    parser.add_argument('dataset_id')
+    parser.add_argument('--engines', default='random_forest,hist_gradient_boosting')
+    parser.add_argument('--candidates', type=int, default=12)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--time-budget', type=float, default=60)
+    parser.add_argument('--memory-budget-mb', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    from app import iter_tuning  # the app owns the dataset store and model registry
+
+    for event, payload in iter_tuning(args.dataset_id, args.engines.split(','), args.candidates, args.eta,
+                                      args.time_budget, args.memory_budget_mb, args.workers):
+        print(event, json.dumps(payload, default=str), flush=True)
+
+
+if __name__ == '__main__':
+    main()